@@ -0,0 +1,132 @@
+"""
+Benchmark de arranque en frío.
+
+Mide dos cosas:
+  1. Tiempo de importar `main` (y del proceso completo de Python) en un
+     proceso nuevo, para vigilar lo que cuesta cargar la aplicación.
+  2. Tiempo hasta la primera respuesta de N workers uvicorn que arrancan a la
+     vez sobre la misma base SQLite, comparando:
+       verificar  base ya migrada: cada worker solo lee la versión del esquema
+       migrar     base nueva y DB_MIGRAR_AL_ARRANCAR=true: cada worker intenta
+                  migrar al arrancar (el comportamiento anterior, DDL en cada worker)
+
+Uso:
+    python benchmarks/arranque.py --repeticiones 5 --workers 1 4 8
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+CODIGO_IMPORTACION = (
+    "import time; inicio = time.perf_counter(); import main; "
+    "print(time.perf_counter() - inicio)"
+)
+
+# ======================
+# 📦 TIEMPO DE IMPORTACIÓN
+# ======================
+
+def medir_importacion(repeticiones: int, url: str) -> tuple[float, float]:
+    """Mediana de (importar main, proceso completo) en milisegundos."""
+    importaciones, procesos = [], []
+    entorno = dict(os.environ, DATABASE_URL=url)
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run(
+            [sys.executable, "-c", CODIGO_IMPORTACION],
+            cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True,
+        )
+        procesos.append(time.perf_counter() - inicio)
+        importaciones.append(float(salida.stdout.strip().splitlines()[-1]))
+    return statistics.median(importaciones) * 1000, statistics.median(procesos) * 1000
+
+# ======================
+# 🚀 TIEMPO HASTA LA PRIMERA PETICIÓN
+# ======================
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _primera_respuesta(puerto: int, limite: float = 60.0) -> bool:
+    fin = time.perf_counter() + limite
+    while time.perf_counter() < fin:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/", timeout=1) as respuesta:
+                return respuesta.status == 200
+        except OSError:
+            time.sleep(0.01)
+    return False
+
+
+def medir_primera_peticion(workers: int, url: str, migrar: bool) -> list[float]:
+    """Arranca `workers` procesos a la vez y devuelve cuánto tardó cada uno en responder (ms)."""
+    entorno = dict(os.environ, DATABASE_URL=url, DB_MIGRAR_AL_ARRANCAR="true" if migrar else "false")
+    procesos = []
+    inicio = time.perf_counter()
+    for _ in range(workers):
+        puerto = _puerto_libre()
+        proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "error"],
+            cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        procesos.append((proceso, puerto))
+    tiempos = []
+    try:
+        for proceso, puerto in procesos:
+            if not _primera_respuesta(puerto):
+                raise RuntimeError("un worker no respondió")
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        for proceso, _ in procesos:
+            proceso.terminate()
+            proceso.wait()
+    return tiempos
+
+
+def _base_migrada() -> str:
+    import migraciones
+    from db import crear_engine
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'arranque.db')}"
+    engine = crear_engine(url)
+    migraciones.aplicar_migraciones(engine)
+    engine.dispose()
+    return url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    importacion, proceso = medir_importacion(args.repeticiones, _base_migrada())
+    print(f"📦 import main: {importacion:.0f} ms (proceso completo: {proceso:.0f} ms, mediana de {args.repeticiones})")
+
+    print(f"{'modo':<10} {'workers':>8} {'mediana ms':>11} {'máximo ms':>10}")
+    for workers in args.workers:
+        for modo in ("verificar", "migrar"):
+            medianas, maximos = [], []
+            for _ in range(args.repeticiones):
+                url = _base_migrada() if modo == "verificar" else f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'arranque.db')}"
+                tiempos = medir_primera_peticion(workers, url, migrar=modo == "migrar")
+                medianas.append(statistics.median(tiempos))
+                maximos.append(max(tiempos))
+            print(f"{modo:<10} {workers:>8} {statistics.median(medianas):>11.0f} {statistics.median(maximos):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
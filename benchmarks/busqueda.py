@@ -0,0 +1,111 @@
+"""
+Benchmark de búsqueda de texto: LIKE '%...%' contra FTS5 y el índice en memoria.
+
+Siembra catálogos de 100k y 1M productos con nombres y descripciones
+generados, construye la tabla FTS5 y el índice invertido, y mide la
+latencia p50/p99 de una batería de consultas (palabras completas,
+prefijos y combinaciones de dos términos) con cada motor.
+
+Uso:
+    python benchmarks/busqueda.py --productos 100000 1000000 --repeticiones 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, select
+import busqueda
+from db import crear_engine
+from models import Categoria, Producto
+
+TIPOS = ["Zapatilla", "Camiseta", "Pantalón", "Mochila", "Cuaderno", "Lámpara", "Taza", "Reloj", "Bufanda", "Cámara"]
+ADJETIVOS = ["deportiva", "clásica", "térmica", "ecológica", "compacta", "impermeable", "artesanal", "básica"]
+MATERIALES = ["algodón", "cuero", "acero", "bambú", "lana", "poliéster", "cerámica", "vidrio"]
+USOS = ["para correr", "para la oficina", "de viaje", "para niños", "de invierno", "para el hogar"]
+CONSULTAS = ["zapatilla", "camis", "termica", "algodon", "cuero imper", "lampara ceram", "viaje", "rel acero"]
+
+# ======================
+# 🌱 DATOS
+# ======================
+
+def sembrar(engine, cantidad: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    azar = random.Random(42)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(insert(Categoria), params=[
+            {"nombre": f"Categoria {i}", "activa": True, "fecha_creacion": ahora} for i in range(20)
+        ])
+        for inicio in range(0, cantidad, 50_000):
+            session.exec(insert(Producto), params=[
+                {
+                    "nombre": f"{azar.choice(TIPOS)} {azar.choice(ADJETIVOS)} {i}",
+                    "descripcion": f"Hecha de {azar.choice(MATERIALES)}, ideal {azar.choice(USOS)}",
+                    "precio": 1.0 + i % 500, "stock": i % 50, "activo": i % 10 != 0, "destacado": False,
+                    "fecha_creacion": ahora, "ultima_actualizacion": ahora, "categoria_id": 1 + i % 20,
+                }
+                for i in range(inicio, min(inicio + 50_000, cantidad))
+            ])
+        session.commit()
+
+# ======================
+# ⏱️ MEDICIÓN
+# ======================
+
+def medir(funcion, repeticiones: int) -> tuple[float, float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        for q in CONSULTAS:
+            inicio = time.perf_counter()
+            funcion(q)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2], tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--limite", type=int, default=20, help="tamaño de página de cada búsqueda")
+    args = parser.parse_args()
+
+    print(f"{'productos':>10} {'motor':<8} {'preparación s':>14} {'p50 ms':>9} {'p99 ms':>9}")
+    for cantidad in args.productos:
+        engine = crear_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'busqueda.db')}")
+        sembrar(engine, cantidad)
+
+        inicio = time.perf_counter()
+        with engine.begin() as conexion:
+            busqueda.crear_fts5(conexion)
+        preparacion_fts = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        busqueda.reconstruir_indice(engine)
+        preparacion_memoria = time.perf_counter() - inicio
+
+        with Session(engine) as session:
+            motores = [
+                ("like", 0.0, lambda q: session.exec(busqueda.query_like(q).limit(args.limite)).all()),
+                ("fts5", preparacion_fts, lambda q: session.exec(busqueda.query_fts5(q).limit(args.limite)).all()),
+                ("memoria", preparacion_memoria, lambda q: session.exec(
+                    select(Producto).where(Producto.id.in_(busqueda.indice.buscar(q)[:args.limite]))
+                ).all()),
+            ]
+            for motor, preparacion, funcion in motores:
+                p50, p99 = medir(funcion, args.repeticiones)
+                print(f"{cantidad:>10} {motor:<8} {preparacion:>14.1f} {p50:>9.2f} {p99:>9.2f}")
+        busqueda.indice.vaciar()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
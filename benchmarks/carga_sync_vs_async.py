@@ -0,0 +1,186 @@
+"""
+Benchmark de carga: endpoints síncronos (threadpool) contra asíncronos.
+
+Levanta con uvicorn dos aplicaciones mínimas que ejecutan las mismas
+consultas de lectura de productos, una con `def` + `db.get_session` y otra
+con `async def` + `db.get_async_session`, y mide peticiones/s y latencia
+p50/p99 con 50, 200 y 1000 clientes concurrentes.
+
+Uso:
+    python benchmarks/carga_sync_vs_async.py --clientes 50 200 1000 --duracion 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from fastapi import Depends, FastAPI, HTTPException
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session, get_session
+from models import Producto
+from routers.productos import _query_productos_activos
+
+CATEGORIAS = 20
+PRODUCTOS = 5_000
+
+# ======================
+# 🧪 APLICACIONES BAJO PRUEBA
+# ======================
+
+app_sync = FastAPI()
+app_async = FastAPI()
+
+
+@app_sync.get("/productos/{producto_id}")
+def producto_sync(producto_id: int, session: Session = Depends(get_session)):
+    producto = session.get(Producto, producto_id)
+    if not producto:
+        raise HTTPException(status_code=404)
+    return producto
+
+
+@app_sync.get("/productos/")
+def listado_sync(categoria_id: int, session: Session = Depends(get_session)):
+    return session.exec(_query_productos_activos(None, None, None, None, categoria_id).limit(50)).all()
+
+
+@app_async.get("/productos/{producto_id}")
+async def producto_async(producto_id: int, session: AsyncSession = Depends(get_async_session)):
+    producto = await session.get(Producto, producto_id)
+    if not producto:
+        raise HTTPException(status_code=404)
+    return producto
+
+
+@app_async.get("/productos/")
+async def listado_async(categoria_id: int, session: AsyncSession = Depends(get_async_session)):
+    return (await session.exec(_query_productos_activos(None, None, None, None, categoria_id).limit(50))).all()
+
+
+# ======================
+# 🌱 DATOS Y SERVIDOR
+# ======================
+
+def sembrar(url: str) -> None:
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel
+    from db import crear_engine
+    from models import Categoria
+
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(insert(Categoria), params=[
+            {"nombre": f"Categoria {i}", "activa": True, "fecha_creacion": ahora} for i in range(CATEGORIAS)
+        ])
+        session.exec(insert(Producto), params=[
+            {
+                "nombre": f"Producto {i}", "precio": 1.0 + i % 500, "stock": i % 50, "activo": True,
+                "destacado": False, "fecha_creacion": ahora, "ultima_actualizacion": ahora,
+                "categoria_id": 1 + i % CATEGORIAS,
+            }
+            for i in range(PRODUCTOS)
+        ])
+        session.commit()
+    engine.dispose()
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar(app: str, url: str, puerto: int) -> subprocess.Popen:
+    entorno = dict(os.environ, DATABASE_URL=url, PYTHONPATH=RAIZ)
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"benchmarks.carga_sync_vs_async:{app}",
+         "--port", str(puerto), "--log-level", "warning", "--no-access-log"],
+        cwd=RAIZ, env=entorno,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError(f"uvicorn no arrancó para {app}")
+
+
+# ======================
+# 🚦 GENERADOR DE CARGA
+# ======================
+
+async def cargar(base: str, clientes: int, duracion: float) -> dict:
+    import httpx
+
+    latencias: list[float] = []
+    errores = 0
+    fin = time.perf_counter() + duracion
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=60) as cliente:
+        async def trabajador():
+            nonlocal errores
+            while time.perf_counter() < fin:
+                if random.random() < 0.7:
+                    ruta = f"/productos/{random.randint(1, PRODUCTOS)}"
+                else:
+                    ruta = f"/productos/?categoria_id={random.randint(1, CATEGORIAS)}"
+                inicio = time.perf_counter()
+                try:
+                    respuesta = await cliente.get(ruta)
+                    errores += respuesta.status_code != 200
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - inicio)
+
+        await asyncio.gather(*(trabajador() for _ in range(clientes)))
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+    return {
+        "rps": len(latencias) / duracion,
+        "p50_ms": percentil(0.50),
+        "p99_ms": percentil(0.99),
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos por escenario")
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.db')}"
+    sembrar(url)
+
+    print(f"{'modo':<6} {'clientes':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for app, modo in (("app_sync", "sync"), ("app_async", "async")):
+        puerto = puerto_libre()
+        servidor = levantar(app, url, puerto)
+        try:
+            for clientes in args.clientes:
+                r = asyncio.run(cargar(f"http://127.0.0.1:{puerto}", clientes, args.duracion))
+                print(f"{modo:<6} {clientes:>8} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errores']:>8}")
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark de la cascada al desactivar una categoría.
+
+Compara el bucle ORM anterior (cargar `categoria.productos` y marcar cada
+producto) con el UPDATE masivo de `routers.categorias._sentencia_cascada`.
+
+Uso:
+    python benchmarks/cascada_categoria.py --tamanos 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session
+from db import crear_engine
+from models import Categoria, Producto
+from routers.categorias import _sentencia_cascada
+
+
+def crear_base(productos: int):
+    engine = crear_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Bench")
+        session.add(categoria)
+        session.commit()
+        filas = [
+            {
+                "nombre": f"Producto {i}", "precio": 1.0, "stock": 10, "activo": True,
+                "destacado": False, "fecha_creacion": ahora, "ultima_actualizacion": ahora,
+                "categoria_id": categoria.id,
+            }
+            for i in range(productos)
+        ]
+        session.exec(insert(Producto), params=filas)
+        session.commit()
+        return engine, categoria.id
+
+
+def cascada_orm(session: Session, categoria_id: int) -> int:
+    """Réplica de la cascada anterior: carga la relación y actualiza fila por fila."""
+    categoria = session.get(Categoria, categoria_id)
+    categoria.activa = False
+    for producto in categoria.productos:
+        producto.activo = False
+        session.add(producto)
+    session.add(categoria)
+    session.commit()
+    return len(categoria.productos)
+
+
+def cascada_masiva(session: Session, categoria_id: int) -> int:
+    categoria = session.get(Categoria, categoria_id)
+    categoria.activa = False
+    session.add(categoria)
+    afectados = len(session.exec(_sentencia_cascada(categoria_id, False)).all())
+    session.commit()
+    return afectados
+
+
+def medir(funcion, productos: int):
+    engine, categoria_id = crear_base(productos)
+    with Session(engine) as session:
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        afectados = funcion(session, categoria_id)
+        duracion = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return duracion, pico / 1024 / 1024, afectados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'productos':>10} {'orm (s)':>10} {'orm MiB':>9} {'masivo (s)':>11} {'masivo MiB':>11} {'mejora':>8}")
+    for productos in args.tamanos:
+        t_orm, m_orm, _ = medir(cascada_orm, productos)
+        t_bulk, m_bulk, afectados = medir(cascada_masiva, productos)
+        assert afectados == productos
+        print(f"{productos:>10} {t_orm:>10.3f} {m_orm:>9.1f} {t_bulk:>11.3f} {m_bulk:>11.1f} {t_orm / t_bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark de compras concurrentes sobre un mismo producto.
+
+Lanza N hilos que compran el mismo SKU y compara la ruta antigua
+(leer, validar en Python, restar y hacer commit) con el UPDATE condicional
+de `inventario.sentencia_descuento`. Verifica que nunca se sobrevenda.
+
+Uso:
+    python benchmarks/compra_concurrente.py --hilos 16 --compras 200 --stock 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session
+from db import crear_engine
+from inventario import sentencia_descuento
+from models import Categoria, Producto
+
+
+def crear_base(stock: int):
+    ruta = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = crear_engine(f"sqlite:///{ruta}", pool_size=32)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Bench")
+        session.add(categoria)
+        session.commit()
+        producto = Producto(nombre="SKU", precio=1.0, stock=stock, categoria_id=categoria.id)
+        session.add(producto)
+        session.commit()
+        return engine, producto.id
+
+
+def compra_leer_y_escribir(engine, producto_id: int) -> bool:
+    """Réplica de la ruta anterior: lectura, validación en Python y escritura."""
+    with Session(engine) as session:
+        producto = session.get(Producto, producto_id)
+        if not producto.activo or producto.stock < 1:
+            return False
+        producto.stock -= 1
+        producto.ultima_actualizacion = datetime.utcnow()
+        session.add(producto)
+        session.commit()
+        return True
+
+
+def compra_atomica(engine, producto_id: int) -> bool:
+    with Session(engine) as session:
+        ok = session.exec(sentencia_descuento(producto_id, 1)).scalar_one_or_none() is not None
+        session.commit()
+        return ok
+
+
+def ejecutar(nombre, funcion, hilos: int, compras: int, stock: int):
+    engine, producto_id = crear_base(stock)
+
+    def tarea(_):
+        while True:
+            try:
+                return funcion(engine, producto_id)
+            except OperationalError:
+                continue  # "database is locked": se reintenta
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        exitosas = sum(pool.map(tarea, range(compras)))
+    duracion = time.perf_counter() - inicio
+
+    with Session(engine) as session:
+        stock_final = session.get(Producto, producto_id).stock
+    vendido = stock - stock_final
+    sobreventa = exitosas - vendido
+    print(
+        f"{nombre:<20} compras/s={compras / duracion:9.1f}  exitosas={exitosas:5d}  "
+        f"stock_final={stock_final:5d}  sobreventa={sobreventa}"
+    )
+    return sobreventa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--compras", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=300, help="menor que --compras para forzar agotamiento")
+    args = parser.parse_args()
+
+    ejecutar("leer-y-escribir", compra_leer_y_escribir, args.hilos, args.compras, args.stock)
+    sobreventa = ejecutar("update-atomico", compra_atomica, args.hilos, args.compras, args.stock)
+    if sobreventa:
+        sys.exit("❌ La ruta atómica sobrevendió stock")
+
+
+if __name__ == "__main__":
+    main()
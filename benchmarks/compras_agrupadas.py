@@ -0,0 +1,119 @@
+"""
+Benchmark de compras por segundo: commit por petición contra commit agrupado.
+
+Ejecuta la aplicación real en proceso, sin red, y lanza `--compras` compras
+de una unidad repartidas entre `--productos` SKU (una venta flash concentra
+casi todo en pocos productos), con distintos niveles de concurrencia:
+  por-peticion   COMPRAS_AGRUPADAS=0: cada compra hace su propio commit
+  agrupadas      COMPRAS_AGRUPADAS=1: la cola de cola_compras.py confirma por lotes
+
+Cada modo corre en un proceso nuevo con su propia base. Se informa de las
+compras por segundo, la latencia por petición y los errores (p. ej.
+"database is locked"), y se comprueba que el stock descontado coincide con
+las compras aceptadas.
+
+Uso:
+    python benchmarks/compras_agrupadas.py --compras 3000 --concurrencia 16 64 256 --productos 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+STOCK_INICIAL = 1_000_000
+
+
+async def _medir(compras: int, concurrencia: int, productos: int) -> dict:
+    import httpx
+    import main
+    import migraciones
+    from sqlmodel import Session
+    from db import engine
+    from models import Categoria, Producto
+
+    migraciones.aplicar_migraciones(engine)
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Flash")
+        session.add(categoria)
+        session.commit()
+        skus = [Producto(nombre=f"SKU {i}", precio=1.0, stock=STOCK_INICIAL, categoria_id=categoria.id) for i in range(productos)]
+        session.add_all(skus)
+        session.commit()
+        ids = [sku.id for sku in skus]
+
+    latencias: list[float] = []
+    errores = 0
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def compra(cliente, numero: int):
+        nonlocal errores
+        async with limite:
+            inicio = time.perf_counter()
+            respuesta = await cliente.patch(f"/productos/{ids[numero % productos]}/comprar", json={"cantidad": 1})
+            latencias.append(time.perf_counter() - inicio)
+            errores += respuesta.status_code != 200
+
+    # Los errores ("database is locked") cuentan como respuestas fallidas, no abortan la medición
+    transporte = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://tienda") as cliente:
+            await asyncio.gather(*(compra(cliente, i) for i in range(min(100, compras))))
+            calentamiento = len(latencias) - errores
+            latencias.clear()
+            errores = 0
+            inicio = time.perf_counter()
+            await asyncio.gather(*(compra(cliente, i) for i in range(compras)))
+            duracion = time.perf_counter() - inicio
+
+    with Session(engine) as session:
+        vendido = sum(STOCK_INICIAL - session.get(Producto, i).stock for i in ids)
+    latencias.sort()
+    return {
+        "compras_s": compras / duracion,
+        "p50_ms": statistics.median(latencias) * 1000,
+        "p99_ms": latencias[int(len(latencias) * 0.99) - 1] * 1000,
+        "errores": errores,
+        "descuadre": vendido - calentamiento - (compras - errores),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--productos", type=int, default=4)
+    parser.add_argument("--hijo", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(asyncio.run(_medir(args.compras, args.hijo, args.productos))))
+        return
+
+    print(f"{'modo':<13} {'concurrencia':>12} {'compras/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    descuadres = 0
+    for concurrencia in args.concurrencia:
+        for modo, agrupadas in (("por-peticion", "0"), ("agrupadas", "1")):
+            url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'compras.db')}"
+            entorno = dict(os.environ, DATABASE_URL=url, COMPRAS_AGRUPADAS=agrupadas)
+            salida = subprocess.run(
+                [sys.executable, __file__, "--hijo", str(concurrencia), "--compras", str(args.compras), "--productos", str(args.productos)],
+                env=entorno, cwd=RAIZ, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(salida.stdout.strip().splitlines()[-1])
+            descuadres += r["descuadre"] != 0
+            print(f"{modo:<13} {concurrencia:>12} {r['compras_s']:>10.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errores']:>8}")
+    if descuadres:
+        sys.exit("❌ El stock descontado no coincide con las compras aceptadas")
+
+
+if __name__ == "__main__":
+    main()
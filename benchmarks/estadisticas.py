@@ -0,0 +1,131 @@
+"""
+Benchmark de estadísticas por categoría.
+
+Para cada tamaño de catálogo crea una base nueva (la carga masiva pasa por
+los triggers), comprueba que la tabla `categoria_stats` coincide con el
+agregado y mide:
+  - la lectura de una categoría: agregado COUNT/SUM/MIN/MAX calculado en cada
+    petición contra la fila precalculada (búsqueda por clave primaria);
+  - lo que añaden los triggers de mantenimiento a una compra y a la cascada
+    de desactivar/reactivar una categoría (con y sin triggers).
+
+Uso:
+    python benchmarks/estadisticas.py --productos 10000 100000 --categorias 10 --repeticiones 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text, update
+from sqlmodel import Session, select
+import estadisticas
+import migraciones
+from db import crear_engine
+from inventario import sentencia_descuento
+from models import Categoria, CategoriaEstadisticas, Producto
+
+
+def sembrar(engine, categorias: int, productos: int) -> None:
+    azar = random.Random(42)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(insert(Categoria), params=[
+            {"nombre": f"Categoria {i}", "activa": True, "fecha_creacion": ahora} for i in range(categorias)
+        ])
+        for inicio in range(0, productos, 50_000):
+            session.exec(insert(Producto), params=[
+                {
+                    "nombre": f"Producto {i}", "precio": round(azar.uniform(1, 1000), 2),
+                    "stock": 1_000_000, "activo": azar.random() > 0.1, "destacado": False,
+                    "fecha_creacion": ahora, "ultima_actualizacion": ahora,
+                    "categoria_id": 1 + i % categorias,
+                }
+                for i in range(inicio, min(inicio + 50_000, productos))
+            ])
+        session.commit()
+
+
+def medir(funcion, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+
+def medir_escrituras(engine, producto_id: int, repeticiones: int) -> tuple[float, float]:
+    """Mediana (ms) de una compra y de una cascada de categoría, cada una en su transacción."""
+    with Session(engine) as session:
+        def compra():
+            session.exec(sentencia_descuento(producto_id, 1))
+            session.commit()
+
+        estado = {"activo": False}
+
+        def cascada():
+            session.exec(
+                update(Producto).where(Producto.categoria_id == 1, Producto.activo != estado["activo"])
+                .values(activo=estado["activo"])
+            )
+            session.commit()
+            estado["activo"] = not estado["activo"]
+        return medir(compra, repeticiones), medir(cascada, max(2, repeticiones // 10) // 2 * 2)
+
+
+def quitar_triggers(engine) -> None:
+    with engine.begin() as conexion:
+        nombres = conexion.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'categoria_stats_%'"
+        )).scalars().all()
+        for nombre in nombres:
+            conexion.execute(text(f"DROP TRIGGER {nombre}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--categorias", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'productos':>10} {'agregado ms':>12} {'precalculado ms':>16} "
+          f"{'compra ms (sin/con)':>20} {'cascada ms (sin/con)':>21}")
+    for productos in args.productos:
+        engine = crear_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'estadisticas.db')}")
+        migraciones.aplicar_migraciones(engine)
+        sembrar(engine, args.categorias, productos)
+
+        with engine.connect() as conexion:
+            if estadisticas.diferencias(conexion):
+                sys.exit("❌ La tabla de estadísticas no coincide con el agregado")
+        with Session(engine) as session:
+            agregado = medir(lambda: session.exec(estadisticas.consulta_agregados(1)).one(), args.repeticiones)
+
+            def precalculado():
+                session.expunge_all()
+                session.get(CategoriaEstadisticas, 1)
+            leido = medir(precalculado, args.repeticiones)
+            producto_id = session.exec(select(Producto.id).where(Producto.activo == True).limit(1)).one()
+
+        compra_con, cascada_con = medir_escrituras(engine, producto_id, args.repeticiones)
+        with engine.connect() as conexion:
+            if estadisticas.diferencias(conexion):
+                sys.exit("❌ Los triggers dejaron la tabla de estadísticas inconsistente")
+        quitar_triggers(engine)
+        compra_sin, cascada_sin = medir_escrituras(engine, producto_id, args.repeticiones)
+        engine.dispose()
+        print(f"{productos:>10} {agregado:>12.3f} {leido:>16.3f} "
+              f"{compra_sin:>9.3f} / {compra_con:<8.3f} {cascada_sin:>9.3f} / {cascada_con:<9.3f}")
+
+
+if __name__ == "__main__":
+    main()
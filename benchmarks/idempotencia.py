@@ -0,0 +1,95 @@
+"""
+Benchmark de una tormenta de reintentos sobre PATCH /productos/{id}/comprar.
+
+Ejecuta la aplicación real en proceso, sin red. Cada compra se envía una vez
+y se repite `--reintentos` veces: la mitad de los reintentos llegan mientras
+la original sigue en curso y el resto después. Compara:
+  sin-clave   cada reintento vuelve a ejecutar la transacción (y descuenta otra vez)
+  con-clave   Idempotency-Key: la original escribe una vez y los reintentos
+              reciben la respuesta guardada (en curso: esperan a la original)
+
+Informa del tiempo total, de las transacciones de compra que llegaron a la
+base y del stock descontado de más.
+
+Uso:
+    python benchmarks/idempotencia.py --compras 300 --reintentos 4 --concurrencia 16
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'idempotencia.db')}")
+
+STOCK_INICIAL = 1_000_000
+
+
+async def _tormenta(cliente, producto_id: int, compras: int, reintentos: int, concurrencia: int, con_clave: bool, prefijo: str):
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def compra(numero: int):
+        headers = {"Idempotency-Key": f"{prefijo}-{numero}"} if con_clave else {}
+
+        async def enviar():
+            respuesta = await cliente.patch(f"/productos/{producto_id}/comprar", json={"cantidad": 1}, headers=headers)
+            return respuesta.headers.get("idempotent-replayed") is None
+
+        async with limite:
+            # La original y la mitad de los reintentos a la vez (timeout del cliente)...
+            ejecutadas = sum(await asyncio.gather(*(enviar() for _ in range(1 + reintentos // 2))))
+            # ...y el resto cuando la original ya terminó
+            for _ in range(reintentos - reintentos // 2):
+                ejecutadas += await enviar()
+            return ejecutadas
+
+    return sum(await asyncio.gather(*(compra(i) for i in range(compras))))
+
+
+async def _medir(compras: int, reintentos: int, concurrencia: int):
+    import httpx
+    import main
+    import migraciones
+    from sqlmodel import Session
+    from db import engine
+    from models import Categoria, Producto
+
+    migraciones.aplicar_migraciones(engine)
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Bench")
+        session.add(categoria)
+        session.commit()
+        productos = [Producto(nombre=f"SKU {modo}", precio=1.0, stock=STOCK_INICIAL, categoria_id=categoria.id) for modo in range(2)]
+        session.add_all(productos)
+        session.commit()
+        ids = [producto.id for producto in productos]
+
+    transporte = httpx.ASGITransport(app=main.app)
+    print(f"{'modo':<10} {'peticiones':>10} {'segundos':>9} {'escrituras':>11} {'stock de más':>13}")
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://tienda") as cliente:
+            for producto_id, con_clave in zip(ids, (False, True)):
+                inicio = time.perf_counter()
+                ejecutadas = await _tormenta(cliente, producto_id, compras, reintentos, concurrencia, con_clave, "bench")
+                duracion = time.perf_counter() - inicio
+                with Session(engine) as session:
+                    descontado = STOCK_INICIAL - session.get(Producto, producto_id).stock
+                modo = "con-clave" if con_clave else "sin-clave"
+                print(f"{modo:<10} {compras * (1 + reintentos):>10} {duracion:>9.2f} {ejecutadas:>11} {descontado - compras:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=300)
+    parser.add_argument("--reintentos", type=int, default=4, help="reintentos por compra")
+    parser.add_argument("--concurrencia", type=int, default=16, help="compras distintas en curso a la vez")
+    args = parser.parse_args()
+    asyncio.run(_medir(args.compras, args.reintentos, args.concurrencia))
+
+
+if __name__ == "__main__":
+    main()
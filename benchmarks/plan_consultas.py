@@ -0,0 +1,127 @@
+"""
+Verificación de planes de consulta para los filtros de productos.
+
+Ejecuta EXPLAIN QUERY PLAN sobre cada combinación de filtros con las sentencias
+que ejecuta `listar_productos` y termina con error si alguna:
+  - recorre la tabla `producto` completa (SCAN) teniendo filtros: solo el
+    catálogo sin filtrar recorre el rowid o el índice de precio en orden, porque
+    todas sus filas activas coinciden;
+  - busca en un índice solo por `activo=?` (casi todas las filas son activas);
+  - ordena en un B-tree temporal una página por keyset, salvo la continuación
+    tras la ventana, que ordena solo las filas del rango posteriores a ella.
+La consulta que busca el final de la ventana puede recorrer el rowid o el
+índice de precio sin filtros ni ordenar: se detiene a VENTANA_KEYSET entradas.
+
+Uso:
+    python benchmarks/plan_consultas.py
+"""
+
+import itertools
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel, create_engine
+from paginacion import codificar_cursor
+from routers.productos import (
+    _aplicar_keyset, _consulta_en_ventana, _consulta_limite_ventana, _consulta_tras_ventana,
+    _orden_listado, _query_productos_activos, _usa_ventana,
+)
+
+FILTROS = {
+    "stock_min": 1,
+    "stock_max": 100,
+    "precio_min": 10.0,
+    "precio_max": 500.0,
+    "categoria_id": 1,
+}
+
+# (orden, cursor) de cada variante paginada; el listado completo ordena por id sin keyset
+VARIANTES_KEYSET = {
+    "keyset id": ("id", None),
+    "keyset id+cursor": ("id", codificar_cursor(1000)),
+    "keyset precio": ("precio", None),
+    "keyset precio+cur": ("precio", codificar_cursor(250.0, 1000)),
+}
+
+# Final de ventana supuesto para las sentencias que dependen de él
+LIMITE_VENTANA = {"id": (6000,), "precio": (300.0, 6000)}
+
+SOLO_ACTIVO = re.compile(r"^SEARCH producto USING (COVERING )?INDEX \w+ \(activo=\?\)$")
+SOLO_INDICE = re.compile(r"^SCAN producto( USING COVERING INDEX \w+)?$")
+
+
+def combinaciones():
+    for n in range(len(FILTROS) + 1):
+        for nombres in itertools.combinations(FILTROS, n):
+            yield {nombre: FILTROS.get(nombre) if nombre in nombres else None for nombre in FILTROS}
+
+
+def plan(conexion, query) -> list[str]:
+    sql = str(query.compile(dialect=conexion.dialect, compile_kwargs={"literal_binds": True}))
+    return [fila[-1] for fila in conexion.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def sentencias(filtros: dict) -> dict:
+    """Las sentencias que ejecuta el listado para estos filtros, por variante."""
+    tupla = tuple(filtros.values())
+    variantes = {"listado": _query_productos_activos(**filtros).order_by(_orden_listado(tupla))}
+    for variante, (orden, cursor) in VARIANTES_KEYSET.items():
+        pagina = _aplicar_keyset(_query_productos_activos(**filtros, orden=orden, cursor=cursor), orden, cursor).limit(101)
+        if not _usa_ventana(tupla, orden):
+            variantes[variante] = pagina
+            continue
+        limite = LIMITE_VENTANA[orden]
+        variantes[f"{variante} [límite]"] = _consulta_limite_ventana(orden, cursor)
+        variantes[f"{variante} [ventana]"] = _consulta_en_ventana(pagina, orden, limite)
+        variantes[f"{variante} [tras]"] = _consulta_tras_ventana(tupla, orden, limite).limit(101)
+    return variantes
+
+
+def problemas(variante: str, filtros: dict, detalle: list[str]) -> list[str]:
+    encontrados = []
+    if variante.endswith("[límite]"):
+        if not all(SOLO_INDICE.match(paso) or paso.startswith("SEARCH producto") for paso in detalle):
+            encontrados.append("límite de ventana que lee filas u ordena")
+        return encontrados
+    if any(SOLO_ACTIVO.match(paso) for paso in detalle):
+        encontrados.append("índice solo por activo")
+    sin_filtros = all(valor is None for valor in filtros.values())
+    if not sin_filtros and any(paso.startswith("SCAN producto") for paso in detalle):
+        encontrados.append("tabla completa")
+    if variante.startswith("keyset") and not variante.endswith("[tras]") and any("TEMP B-TREE" in paso for paso in detalle):
+        encontrados.append("B-tree temporal")
+    return encontrados
+
+
+def verificar(imprimir: bool = False) -> list[str]:
+    """Devuelve las variantes con un plan que no escala (y las imprime todas si se pide)."""
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'plan.db')}")
+    SQLModel.metadata.create_all(engine)
+
+    fallos = []
+    with engine.connect() as conexion:
+        for filtros in combinaciones():
+            activos = ", ".join(k for k, v in filtros.items() if v is not None) or "solo activo"
+            for variante, query in sentencias(filtros).items():
+                detalle = plan(conexion, query)
+                encontrados = problemas(variante, filtros, detalle)
+                if encontrados:
+                    fallos.append(f"[{variante}] {activos}: {', '.join(encontrados)}")
+                if imprimir:
+                    marca = f"❌ {', '.join(encontrados)}: " if encontrados else "✅ "
+                    print(f"{marca}[{variante:<26}] {activos:<60} {' | '.join(detalle)}")
+    return fallos
+
+
+def main():
+    fallos = verificar(imprimir=True)
+    if fallos:
+        sys.exit(f"❌ {len(fallos)} consultas con un plan que no escala")
+
+
+if __name__ == "__main__":
+    main()
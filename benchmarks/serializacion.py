@@ -0,0 +1,90 @@
+"""
+Benchmark de serialización de listados: camino ORM + response_model contra
+columnas planas + orjson (`serializacion.py`).
+
+El camino ORM reproduce lo que hace FastAPI con `response_model`: hidratar
+objetos Producto, validarlos contra List[ProductoRead] con from_attributes,
+volcarlos a tipos JSON y codificarlos con json.dumps. El camino rápido lee
+solo las columnas de ProductoRead y las codifica con orjson. Verifica además
+que ambos producen exactamente el mismo JSON.
+
+Uso:
+    python benchmarks/serializacion.py --filas 1000 10000 --repeticiones 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, select
+import serializacion
+from db import crear_engine
+from models import Categoria, Producto
+from schemas import ProductoRead
+
+LISTA_PRODUCTOS = TypeAdapter(List[ProductoRead])
+
+
+def camino_orm(session: Session, filas: int) -> bytes:
+    productos = session.exec(select(Producto).order_by(Producto.id).limit(filas)).all()
+    validados = LISTA_PRODUCTOS.validate_python(productos, from_attributes=True)
+    contenido = LISTA_PRODUCTOS.dump_python(validados, mode="json")
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def camino_rapido(session: Session, filas: int) -> bytes:
+    query = select(*serializacion.COLUMNAS_PRODUCTO).order_by(Producto.id).limit(filas)
+    return serializacion.filas_a_json(session.exec(query).all())
+
+
+def medir(funcion, session: Session, filas: int, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        session.expunge_all()
+        inicio = time.perf_counter()
+        funcion(session, filas)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = crear_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serializacion.db')}")
+    SQLModel.metadata.create_all(engine)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(insert(Categoria), params=[{"nombre": "Categoria", "activa": True, "fecha_creacion": ahora}])
+        session.exec(insert(Producto), params=[
+            {
+                "nombre": f"Producto {i}", "descripcion": f"Descripción ñ {i}" if i % 2 else None,
+                "precio": 1.5 + i % 500, "stock": i % 50, "activo": True, "destacado": False,
+                "fecha_creacion": ahora, "ultima_actualizacion": ahora, "categoria_id": 1,
+            }
+            for i in range(max(args.filas))
+        ])
+        session.commit()
+
+        print(f"{'filas':>8} {'ORM + modelo ms':>16} {'columnas + orjson ms':>21} {'aceleración':>12}")
+        for filas in args.filas:
+            if camino_orm(session, filas) != camino_rapido(session, filas):
+                sys.exit(f"❌ Los dos caminos producen JSON distinto con {filas} filas")
+            orm = medir(camino_orm, session, filas, args.repeticiones)
+            rapido = medir(camino_rapido, session, filas, args.repeticiones)
+            print(f"{filas:>8} {orm:>16.2f} {rapido:>21.2f} {orm / rapido:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark de la sobrecarga de las métricas (middleware + eventos del motor).
+
+Ejecuta la aplicación real en proceso, sin red, alternando rondas con
+METRICAS_HABILITADAS=0 y METRICAS_HABILITADAS=1, y compara la mejor
+latencia media de GET /productos/{id} sin caché (una sentencia SQL por
+petición). Alternar y quedarse con el mínimo reduce el ruido de la máquina,
+que a esta escala es mayor que la propia sobrecarga.
+
+Uso:
+    python benchmarks/sobrecarga_metricas.py --peticiones 5000 --rondas 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+PRODUCTOS = 1_000
+
+
+async def _medir(peticiones: int) -> float:
+    import httpx
+    import cache
+    import main
+    import migraciones
+    from sqlmodel import Session
+    from db import engine
+    from models import Categoria, Producto
+
+    migraciones.aplicar_migraciones(engine)
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Categoria")
+        session.add(categoria)
+        session.commit()
+        session.add_all(Producto(nombre=f"Producto {i}", precio=1.0, categoria_id=categoria.id) for i in range(PRODUCTOS))
+        session.commit()
+
+    transporte = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://tienda") as cliente:
+            for i in range(200):
+                await cliente.get(f"/productos/{1 + i % PRODUCTOS}")
+            inicio = time.perf_counter()
+            for i in range(peticiones):
+                cache.productos_por_id.limpiar()
+                await cliente.get(f"/productos/{1 + i % PRODUCTOS}")
+            return (time.perf_counter() - inicio) / peticiones * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=5_000)
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(asyncio.run(_medir(args.peticiones))))
+        return
+
+    resultados: dict[str, list[float]] = {"0": [], "1": []}
+    for _ in range(args.rondas):
+        for habilitadas in ("0", "1"):
+            url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metricas.db')}"
+            entorno = dict(os.environ, DATABASE_URL=url, METRICAS_HABILITADAS=habilitadas)
+            salida = subprocess.run(
+                [sys.executable, __file__, "--hijo", "--peticiones", str(args.peticiones)],
+                env=entorno, cwd=RAIZ, capture_output=True, text=True, check=True,
+            )
+            resultados[habilitadas].append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    sin, con = min(resultados["0"]), min(resultados["1"])
+    print(f"sin métricas: {sin:8.1f} µs/petición")
+    print(f"con métricas: {con:8.1f} µs/petición")
+    print(f"sobrecarga:   {con - sin:8.1f} µs/petición ({(con - sin) / sin:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
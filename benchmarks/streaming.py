@@ -0,0 +1,126 @@
+"""
+Comprobación y medida de los listados en streaming de productos.
+
+Siembra `--productos` productos (varios lotes de TAMANO_LOTE_STREAMING, con
+un 10 % inactivos) y recorre con la aplicación real en proceso, sin red:
+  listado-ndjson     GET /productos/?formato=ndjson
+  listado-limite     GET /productos/?formato=ndjson&limite=N (N > un lote),
+                     siguiendo X-Next-Cursor hasta la última página
+  exportar-csv       GET /productos/exportar?formato=csv (activos e inactivos)
+  exportar-ndjson    GET /productos/exportar?formato=ndjson
+
+Cada respuesta (o cadena de páginas) debe traer todas las filas esperadas, en
+orden de ID y sin repetir: un stream cortado tras el primer lote, o una página
+sin el cursor de la siguiente, termina con error.
+Informa de las filas por segundo de cada recorrido.
+
+Uso:
+    python benchmarks/streaming.py --productos 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'streaming.db')}")
+
+
+def _sembrar(productos: int) -> int:
+    """Inserta los productos y devuelve cuántos quedan activos."""
+    from datetime import datetime
+    from sqlalchemy import insert
+    from sqlmodel import Session
+    import migraciones
+    from db import engine
+    from models import Categoria, Producto
+
+    migraciones.aplicar_migraciones(engine)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Streaming")
+        session.add(categoria)
+        session.commit()
+        session.exec(insert(Producto), params=[
+            {
+                "nombre": f"Producto {i}", "descripcion": f"Descripción, con \"comillas\" {i}",
+                "precio": 1.0 + i % 1000, "stock": i % 100, "activo": i % 10 != 0, "destacado": False,
+                "fecha_creacion": ahora, "ultima_actualizacion": ahora, "categoria_id": categoria.id,
+            }
+            for i in range(productos)
+        ])
+        session.commit()
+    return productos - (productos + 9) // 10
+
+
+def _ids_ndjson(texto: str) -> list[int]:
+    import orjson
+    return [orjson.loads(linea)["id"] for linea in texto.splitlines()]
+
+
+def _ids_csv(texto: str) -> list[int]:
+    import csv
+    import io
+    return [int(fila["id"]) for fila in csv.DictReader(io.StringIO(texto))]
+
+
+async def _obtener(cliente, url: str, paginado: bool) -> tuple[int, str]:
+    """GET de `url`; si es paginado, sigue X-Next-Cursor hasta la última página y une los cuerpos."""
+    texto = ""
+    siguiente = url
+    while True:
+        respuesta = await cliente.get(siguiente)
+        texto += respuesta.text
+        cursor = respuesta.headers.get("X-Next-Cursor")
+        if not paginado or respuesta.status_code != 200 or cursor is None:
+            return respuesta.status_code, texto
+        siguiente = f"{url}&cursor={quote(cursor)}"
+
+
+async def _recorrer(productos: int) -> int:
+    import httpx
+    import main
+    from routers.productos import TAMANO_LOTE_STREAMING
+
+    activos = _sembrar(productos)
+    if activos <= TAMANO_LOTE_STREAMING:
+        sys.exit(f"❌ Hacen falta más de {TAMANO_LOTE_STREAMING} productos activos para cruzar un lote")
+    # El máximo que admite `limite`: más de un lote de streaming
+    limite = min(activos, 1000)
+    escenarios = [
+        ("listado-ndjson", "/productos/?formato=ndjson", _ids_ndjson, activos, False),
+        ("listado-limite", f"/productos/?formato=ndjson&limite={limite}", _ids_ndjson, activos, True),
+        ("exportar-csv", "/productos/exportar?formato=csv", _ids_csv, productos, False),
+        ("exportar-ndjson", "/productos/exportar?formato=ndjson", _ids_ndjson, productos, False),
+    ]
+    fallos = 0
+    print(f"{'escenario':<16} {'filas':>8} {'esperadas':>10} {'filas/s':>10}")
+    transporte = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://tienda", timeout=None) as cliente:
+            for nombre, url, leer_ids, esperadas, paginado in escenarios:
+                inicio = time.perf_counter()
+                estado, texto = await _obtener(cliente, url, paginado)
+                duracion = time.perf_counter() - inicio
+                ids = leer_ids(texto)
+                correcto = estado == 200 and len(ids) == esperadas and ids == sorted(set(ids))
+                fallos += not correcto
+                print(f"{nombre:<16} {len(ids):>8} {esperadas:>10} {len(ids) / duracion:>10.0f}{'' if correcto else '  ❌'}")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=20000)
+    args = parser.parse_args()
+    if asyncio.run(_recorrer(args.productos)):
+        sys.exit("❌ Algún stream no devolvió todas las filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Suite reproducible de carga de la API de la tienda.
+
+Siembra una base con el número de categorías y productos indicado (con
+semilla fija) y ejecuta contra la aplicación real, en proceso
+(httpx + ASGITransport, sin red) y/o servida con uvicorn, estos escenarios:
+
+    catalogo              GET /productos/?limite=50 y GET /productos/{id}
+    listado_filtrado      GET /productos/ con categoría y rango de precios
+    detalle_categoria     GET /categorias/{id}
+    compra_concurrente    PATCH /productos/{id}/comprar sobre pocos productos
+    desactivacion_masiva  PATCH /categorias/{id}/desactivar y /reactivar
+
+Informa peticiones/s y latencia p50/p95/p99, guarda los resultados en JSON y
+los compara con una base guardada: si un escenario pierde más de la
+tolerancia en peticiones/s o en p95, el proceso termina con código 1. También
+termina con código 1, sin comparar ni guardar la base, si algún escenario
+recibió un código de estado que no esperaba.
+
+Uso:
+    python benchmarks/suite.py --productos 100000 --modo inproc uvicorn --guardar-base
+    python benchmarks/suite.py --productos 100000 --modo inproc uvicorn
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+BASE_POR_DEFECTO = os.path.join(RAIZ, "benchmarks", "base.json")
+
+# Productos con stock alto sobre los que compiten las compras
+PRODUCTOS_DISPUTADOS = 5
+
+# ======================
+# 🌱 DATOS
+# ======================
+
+def sembrar(ruta: str, categorias: int, productos: int, semilla: int) -> None:
+    from sqlalchemy import insert
+    from sqlmodel import Session
+    import migraciones
+    from db import crear_engine
+    from models import Categoria, Producto
+
+    engine = crear_engine(f"sqlite:///{ruta}")
+    migraciones.aplicar_migraciones(engine)
+    azar = random.Random(semilla)
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(insert(Categoria), params=[
+            {"nombre": f"Categoria {i}", "descripcion": None, "activa": True, "fecha_creacion": ahora}
+            for i in range(categorias)
+        ])
+        for inicio in range(0, productos, 50_000):
+            session.exec(insert(Producto), params=[
+                {
+                    "nombre": f"Producto {i}", "descripcion": f"Descripción del producto {i}",
+                    "precio": round(azar.uniform(1, 1000), 2),
+                    "stock": 1_000_000 if i < PRODUCTOS_DISPUTADOS else azar.randint(0, 100),
+                    # Los disputados siempre activos (sin saltarse el número al azar)
+                    "activo": azar.random() > 0.1 or i < PRODUCTOS_DISPUTADOS, "destacado": False,
+                    "fecha_creacion": ahora, "ultima_actualizacion": ahora,
+                    "categoria_id": 1 + azar.randrange(categorias),
+                }
+                for i in range(inicio, min(inicio + 50_000, productos))
+            ])
+        session.commit()
+    engine.dispose()
+
+# ======================
+# 🎬 ESCENARIOS
+# ======================
+# Cada escenario devuelve (método, ruta, cuerpo) y los códigos aceptados.
+# La API responde 404 a toda HTTPException (ver exceptions.py) con el código
+# original al principio de `details`: los códigos se comparan con ese.
+
+def _catalogo(azar: random.Random, datos: dict):
+    if azar.random() < 0.5:
+        return "GET", "/productos/?limite=50", None
+    return "GET", f"/productos/{1 + azar.randrange(datos['productos'])}", None
+
+
+def _listado_filtrado(azar: random.Random, datos: dict):
+    minimo = azar.randint(1, 900)
+    ruta = f"/productos/?categoria_id={1 + azar.randrange(datos['categorias'])}&precio_min={minimo}&precio_max={minimo + 100}&limite=50"
+    return "GET", ruta, None
+
+
+def _detalle_categoria(azar: random.Random, datos: dict):
+    return "GET", f"/categorias/{1 + azar.randrange(datos['categorias'])}", None
+
+
+def _compra_concurrente(azar: random.Random, datos: dict):
+    return "PATCH", f"/productos/{1 + azar.randrange(PRODUCTOS_DISPUTADOS)}/comprar", {"cantidad": 1}
+
+
+def _desactivacion_masiva(azar: random.Random, datos: dict):
+    accion = "desactivar" if azar.random() < 0.5 else "reactivar"
+    return "PATCH", f"/categorias/{1 + azar.randrange(datos['categorias'])}/{accion}", None
+
+
+ESCENARIOS = {
+    "catalogo": (_catalogo, {200}),
+    # 404: ningún producto de la categoría en el rango de precios
+    "listado_filtrado": (_listado_filtrado, {200, 404}),
+    "detalle_categoria": (_detalle_categoria, {200}),
+    # Los productos disputados están activos y su stock no se agota
+    "compra_concurrente": (_compra_concurrente, {200}),
+    # 409: reactivar una categoría que ya está activa
+    "desactivacion_masiva": (_desactivacion_masiva, {200, 409}),
+}
+
+
+def codigo_real(respuesta) -> int:
+    """Código de estado de la respuesta, o el de la HTTPException que la API devolvió como 404."""
+    if respuesta.status_code == 404:
+        try:
+            codigo = str(respuesta.json().get("details", "")).partition(":")[0]
+        except ValueError:
+            codigo = ""
+        if codigo.isdigit():
+            return int(codigo)
+    return respuesta.status_code
+
+# ======================
+# 🚦 GENERADOR DE CARGA
+# ======================
+
+def _percentil(ordenadas: list[float], p: float) -> float:
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))] * 1000 if ordenadas else 0.0
+
+
+async def cargar(cliente, escenario: str, datos: dict, clientes: int, duracion: float, calentamiento: float, semilla: int) -> dict:
+    import httpx
+
+    generar, aceptados = ESCENARIOS[escenario]
+    latencias: list[float] = []
+    inesperados: Counter = Counter()
+    inicio_medicion = time.perf_counter() + calentamiento
+    fin = inicio_medicion + duracion
+
+    async def trabajador(numero: int):
+        azar = random.Random(semilla * 1_000 + numero)
+        while time.perf_counter() < fin:
+            metodo, ruta, cuerpo = generar(azar, datos)
+            inicio = time.perf_counter()
+            try:
+                respuesta = await cliente.request(metodo, ruta, json=cuerpo)
+                codigo = codigo_real(respuesta)
+                fallo = None if codigo in aceptados else str(codigo)
+            except httpx.HTTPError as exc:
+                fallo = type(exc).__name__
+            if inicio >= inicio_medicion:
+                latencias.append(time.perf_counter() - inicio)
+                if fallo:
+                    inesperados[fallo] += 1
+
+    await asyncio.gather(*(trabajador(i) for i in range(clientes)))
+    latencias.sort()
+    return {
+        "peticiones": len(latencias),
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": round(_percentil(latencias, 0.50), 2),
+        "p95_ms": round(_percentil(latencias, 0.95), 2),
+        "p99_ms": round(_percentil(latencias, 0.99), 2),
+        "errores": sum(inesperados.values()),
+        "inesperados": dict(inesperados),
+    }
+
+
+async def _ejecutar_escenarios(cliente, args, datos: dict) -> dict:
+    resultados = {}
+    for escenario in args.escenarios:
+        resultados[escenario] = await cargar(
+            cliente, escenario, datos, args.clientes, args.duracion, args.calentamiento, args.semilla,
+        )
+    return resultados
+
+# ======================
+# 🖥️ MODOS DE EJECUCIÓN
+# ======================
+
+async def _en_proceso(args, datos: dict) -> dict:
+    """Se ejecuta en un proceso hijo: `main` lee DATABASE_URL al importarse."""
+    import httpx
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://tienda", timeout=60) as cliente:
+            return await _ejecutar_escenarios(cliente, args, datos)
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _con_uvicorn(args, datos: dict, url: str) -> dict:
+    import httpx
+
+    puerto = _puerto_libre()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=RAIZ, env=dict(os.environ, DATABASE_URL=url),
+    )
+    try:
+        for _ in range(200):
+            try:
+                socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("uvicorn no arrancó")
+        limites = httpx.Limits(max_connections=args.clientes, max_keepalive_connections=args.clientes)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}", limits=limites, timeout=60) as cliente:
+            return await _ejecutar_escenarios(cliente, args, datos)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def ejecutar_modo(modo: str, args, plantilla: str, datos: dict) -> dict:
+    # Copia limpia de la base sembrada: compras y desactivaciones la modifican
+    ruta = os.path.join(tempfile.mkdtemp(), "suite.db")
+    shutil.copy(plantilla, ruta)
+    url = f"sqlite:///{ruta}"
+    if modo == "uvicorn":
+        return asyncio.run(_con_uvicorn(args, datos, url))
+    salida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--interno-en-proceso", json.dumps(datos), *sys.argv[1:]],
+        cwd=RAIZ, env=dict(os.environ, DATABASE_URL=url), capture_output=True, text=True,
+    )
+    if salida.returncode != 0:
+        raise RuntimeError(salida.stderr)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+# ======================
+# 📏 COMPARACIÓN CON LA BASE
+# ======================
+
+def comparar(resultados: dict, base: dict, tolerancia: float) -> list[str]:
+    """Devuelve las regresiones: menos req/s o más p95 que la base, más allá de la tolerancia."""
+    regresiones = []
+    for clave, actual in resultados.items():
+        anterior = base.get(clave)
+        if anterior is None:
+            continue
+        if actual["rps"] < anterior["rps"] * (1 - tolerancia):
+            regresiones.append(f"{clave}: req/s {anterior['rps']} → {actual['rps']}")
+        if actual["p95_ms"] > anterior["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{clave}: p95 {anterior['p95_ms']} ms → {actual['p95_ms']} ms")
+    return regresiones
+
+
+def _imprimir(resultados: dict, base: dict) -> None:
+    print(f"{'escenario':<32} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8} {'Δ req/s':>9}")
+    for clave, r in resultados.items():
+        anterior = base.get(clave)
+        delta = f"{r['rps'] / anterior['rps'] - 1:+.1%}" if anterior and anterior["rps"] else "-"
+        print(f"{clave:<32} {r['rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errores']:>8} {delta:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categorias", type=int, default=50)
+    parser.add_argument("--productos", type=int, default=20_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--modo", nargs="+", choices=["inproc", "uvicorn"], default=["inproc"])
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--clientes", type=int, default=50, help="clientes concurrentes por escenario")
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos medidos por escenario")
+    parser.add_argument("--calentamiento", type=float, default=2.0, help="segundos previos sin medir")
+    parser.add_argument("--salida", default=None, help="JSON de resultados (por defecto en benchmarks/resultados/)")
+    parser.add_argument("--base", default=BASE_POR_DEFECTO, help="JSON de referencia para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="pérdida relativa admitida antes de fallar")
+    parser.add_argument("--guardar-base", action="store_true", help="guarda estos resultados como nueva base")
+    parser.add_argument("--interno-en-proceso", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno_en_proceso is not None:
+        print(json.dumps(asyncio.run(_en_proceso(args, json.loads(args.interno_en_proceso)))))
+        return
+
+    datos = {"categorias": args.categorias, "productos": args.productos}
+    plantilla = os.path.join(tempfile.mkdtemp(), "plantilla.db")
+    inicio = time.perf_counter()
+    sembrar(plantilla, args.categorias, args.productos, args.semilla)
+    print(f"🌱 {args.categorias} categorías y {args.productos} productos sembrados en {time.perf_counter() - inicio:.1f} s")
+
+    resultados = {}
+    for modo in args.modo:
+        for escenario, r in ejecutar_modo(modo, args, plantilla, datos).items():
+            resultados[f"{modo}/{escenario}"] = r
+
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)["resultados"]
+    _imprimir(resultados, base)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "categorias": args.categorias, "productos": args.productos, "semilla": args.semilla,
+            "clientes": args.clientes, "duracion": args.duracion, "calentamiento": args.calentamiento,
+        },
+        "resultados": resultados,
+    }
+    salida = args.salida or os.path.join(DIRECTORIO_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados en {salida}")
+
+    con_errores = {clave: r["inesperados"] for clave, r in resultados.items() if r["errores"]}
+    if con_errores:
+        print("❌ Respuestas con un código no esperado (sin comparar ni guardar la base):")
+        for clave, inesperados in con_errores.items():
+            print(f"   {clave}: {inesperados}")
+        sys.exit(1)
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        print(f"📌 Base actualizada: {args.base}")
+        return
+    if not base:
+        print(f"ℹ️ Sin base en {args.base}: ejecuta con --guardar-base para crearla")
+        return
+    regresiones = comparar(resultados, base, args.tolerancia)
+    if regresiones:
+        print("❌ Regresiones de rendimiento:")
+        for regresion in regresiones:
+            print(f"   {regresion}")
+        sys.exit(1)
+    print("✅ Sin regresiones respecto a la base")
+
+
+if __name__ == "__main__":
+    main()
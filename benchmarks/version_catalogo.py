@@ -0,0 +1,136 @@
+"""
+Benchmark del contador de versión del catálogo en PostgreSQL.
+
+Lanza `--compras` compras de una unidad sobre `--productos` SKU distintos
+(sin bloqueos de fila entre ellas) con `--concurrencia` transacciones a la
+vez, y compara:
+  sin-version   descuento y commit, sin tocar el contador (cota superior)
+  una-fila      FRAGMENTOS_VERSION = 1: todas las escrituras avanzan la misma fila
+  repartida     el contador de condicionales.py, una fila al azar por escritura
+
+Con una sola fila, el UPDATE del contador la bloquea hasta el commit y las
+transacciones se confirman de una en una. Se comprueba que la versión avanza
+exactamente una vez por compra en los dos modos que la usan.
+
+En SQLite el contador lo avanzan triggers y las escrituras ya van de una en
+una, así que el benchmark necesita un motor con bloqueos por fila.
+
+Uso:
+    python benchmarks/version_catalogo.py --url postgresql://usuario@localhost/tienda --concurrencia 8 32 64
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete
+from sqlalchemy.engine import make_url
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+import condicionales
+from db import crear_async_engine, crear_engine, url_asincrona
+from inventario import descontar_stock
+from migraciones import aplicar_migraciones
+from models import Categoria, Producto
+
+MODOS = ("sin-version", "una-fila", "repartida")
+FRAGMENTOS = condicionales.FRAGMENTOS_VERSION
+
+
+def preparar(url: str, productos: int) -> tuple[int, list[int]]:
+    engine = crear_engine(url)
+    aplicar_migraciones(engine)
+    with Session(engine) as session:
+        categoria = Categoria(nombre="Bench versión")
+        session.add(categoria)
+        session.commit()
+        filas = [
+            Producto(nombre=f"SKU {i}", precio=1.0, stock=10**9, categoria_id=categoria.id)
+            for i in range(productos)
+        ]
+        session.add_all(filas)
+        session.commit()
+        return categoria.id, [producto.id for producto in filas]
+
+
+def limpiar(url: str, categoria_id: int) -> None:
+    engine = crear_engine(url)
+    with Session(engine) as session:
+        session.exec(delete(Producto).where(Producto.categoria_id == categoria_id))
+        session.exec(delete(Categoria).where(Categoria.id == categoria_id))
+        session.commit()
+
+
+async def version(engine) -> int:
+    async with AsyncSession(engine) as session:
+        validadores = await condicionales.version_catalogo(session)
+        return int(validadores.etag.strip('"c'), 16)
+
+
+async def ejecutar(engine, modo: str, ids: list[int], compras: int, concurrencia: int) -> None:
+    condicionales.FRAGMENTOS_VERSION = 1 if modo == "una-fila" else FRAGMENTOS
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def comprar(n: int):
+        async with semaforo:
+            inicio = time.perf_counter()
+            async with AsyncSession(engine) as session:
+                await descontar_stock(session, ids[n % len(ids)], 1)
+                if modo != "sin-version":
+                    await condicionales.avanzar_version(session)
+                await session.commit()
+            latencias.append(time.perf_counter() - inicio)
+
+    antes = await version(engine)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(comprar(n) for n in range(compras)))
+    duracion = time.perf_counter() - inicio
+    avance = await version(engine) - antes
+
+    esperado = 0 if modo == "sin-version" else compras
+    p95 = statistics.quantiles(latencias, n=20)[-1] * 1000
+    print(
+        f"{modo:<12} concurrencia={concurrencia:4d}  compras/s={compras / duracion:8.1f}  "
+        f"p50={statistics.median(latencias) * 1000:7.1f}ms  p95={p95:7.1f}ms  versión +{avance}"
+    )
+    if avance != esperado:
+        sys.exit(f"❌ {modo}: la versión avanzó {avance} veces en {compras} compras")
+
+
+async def medir(url: str, ids: list[int], compras: int, niveles: list[int]) -> None:
+    engine = crear_async_engine(url_asincrona(url), pool_size=max(niveles), max_overflow=0)
+    try:
+        for concurrencia in niveles:
+            for modo in MODOS:
+                await ejecutar(engine, modo, ids, compras, concurrencia)
+    finally:
+        condicionales.FRAGMENTOS_VERSION = FRAGMENTOS
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="URL síncrona de la base (se migra si hace falta)")
+    parser.add_argument("--compras", type=int, default=5000)
+    parser.add_argument("--productos", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[8, 32, 64])
+    args = parser.parse_args()
+
+    if condicionales.mantenida_por_triggers(make_url(args.url).get_backend_name()):
+        sys.exit("❌ En SQLite el contador lo avanzan triggers: usa una base PostgreSQL")
+
+    categoria_id, ids = preparar(args.url, args.productos)
+    try:
+        asyncio.run(medir(args.url, ids, args.compras, args.concurrencia))
+    finally:
+        limpiar(args.url, categoria_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Búsqueda de texto completo sobre `nombre` y `descripcion` de los productos.
+
+En SQLite se usa una tabla virtual FTS5 (`producto_fts`) con contenido externo,
+sincronizada con `producto` mediante triggers, ranking BM25 y un tokenizador
+que ignora tildes. Si FTS5 no está disponible (u otro motor de base de datos),
+se usa un índice invertido en memoria con el mismo comportamiento. Ese índice
+vive en cada worker: una tarea de fondo lo construye al arrancar (mientras
+tanto se busca con LIKE, sin ranking), lo actualizan al momento los endpoints
+del propio worker y la tarea relee cada BUSQUEDA_REFRESCO_SEGUNDOS los
+productos que cambiaron otros workers o la importación por línea de comandos.
+"""
+
+import asyncio
+import logging
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Iterable, Optional
+from sqlalchemy import column, func, literal_column, or_, table, text
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import config
+from models import Producto
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada columna en BM25: el nombre pesa más que la descripción
+PESO_NOMBRE = 10.0
+PESO_DESCRIPCION = 1.0
+
+# "fts5" o "memoria", según lo que detecte `inicializar_busqueda`
+MODO = "memoria"
+
+# En modo "memoria", si el índice ya tiene todos los productos (ver `construir_indice`)
+INDICE_LISTO = False
+
+# ======================
+# 🔤 NORMALIZACIÓN
+# ======================
+
+_PALABRA = re.compile(r"\w+")
+
+
+def tokenizar(texto: Optional[str]) -> list[str]:
+    """Minúsculas, sin tildes ni diéresis (equivale a unicode61 remove_diacritics 2)."""
+    if not texto:
+        return []
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c)
+    )
+    return _PALABRA.findall(sin_tildes)
+
+
+def consulta_fts(q: str) -> Optional[str]:
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura:
+    cada término entre comillas y con `*` para coincidir por prefijo.
+    """
+    terminos = tokenizar(q)
+    if not terminos:
+        return None
+    return " AND ".join(f'"{termino}"*' for termino in terminos)
+
+# ======================
+# 🗃️ FTS5 (SQLITE)
+# ======================
+
+_DDL_FTS5 = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS producto_fts USING fts5(
+        nombre, descripcion,
+        content='producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_ai AFTER INSERT ON producto BEGIN
+        INSERT INTO producto_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_ad AFTER DELETE ON producto BEGIN
+        INSERT INTO producto_fts(producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_au AFTER UPDATE OF nombre, descripcion ON producto BEGIN
+        INSERT INTO producto_fts(producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO producto_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+producto_fts = table("producto_fts", column("rowid"))
+
+
+def fts5_disponible(conexion) -> bool:
+    """Indica si el SQLite de esta conexión se compiló con FTS5."""
+    opciones = {fila[0] for fila in conexion.execute(text("PRAGMA compile_options"))}
+    return "ENABLE_FTS5" in opciones
+
+
+def existe_fts5(conexion) -> bool:
+    return conexion.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'producto_fts'")
+    ).first() is not None
+
+
+def crear_fts5(conexion) -> None:
+    """
+    Crea la tabla FTS5 y sus triggers si no existen. Si la tabla es nueva,
+    la llena con los productos ya existentes. Es DDL: lo ejecutan las
+    migraciones (ver migraciones.py), no los workers.
+    """
+    existia = existe_fts5(conexion)
+    for sentencia in _DDL_FTS5:
+        conexion.execute(text(sentencia))
+    if not existia:
+        conexion.execute(text("INSERT INTO producto_fts(producto_fts) VALUES ('rebuild')"))
+
+
+def query_fts5(q: str):
+    """SELECT de productos activos que coinciden con `q`, ordenados por BM25."""
+    rango = func.bm25(literal_column("producto_fts"), PESO_NOMBRE, PESO_DESCRIPCION)
+    return (
+        select(Producto)
+        .join(producto_fts, producto_fts.c.rowid == Producto.id)
+        .where(literal_column("producto_fts").op("MATCH")(consulta_fts(q)), Producto.activo == True)
+        .order_by(rango, Producto.id)
+    )
+
+# ======================
+# 🐢 LIKE (MIENTRAS SE CONSTRUYE EL ÍNDICE)
+# ======================
+
+def query_like(q: str):
+    """
+    SELECT de productos activos con cada palabra de `q` en el nombre o la
+    descripción, sin ranking. Recorre la tabla: solo para los primeros segundos
+    de un worker sin FTS5, hasta que el índice en memoria está listo.
+    """
+    query = select(Producto).where(Producto.activo == True)
+    for termino in _PALABRA.findall(q):
+        patron = f"%{termino}%"
+        query = query.where(or_(Producto.nombre.ilike(patron), Producto.descripcion.ilike(patron)))
+    return query
+
+# ======================
+# 🧠 ÍNDICE INVERTIDO EN MEMORIA (RESPALDO)
+# ======================
+
+class IndiceInvertido:
+    """
+    Índice invertido con BM25 y coincidencia por prefijo para cuando no hay FTS5.
+    Guarda todos los productos y marca los inactivos para excluirlos del resultado.
+    Vive en el proceso: cada worker mantiene su propia copia (ver `refrescar_indice`).
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._lock = Lock()
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self._postings: dict[str, dict[int, float]] = {}
+        # id -> (términos, longitud, huella del nombre y la descripción)
+        self._documentos: dict[int, tuple[tuple[str, ...], float, int]] = {}
+        self._inactivos: set[int] = set()
+        self._terminos: list[str] = []
+        self._terminos_sucios = False
+        self._longitud_total = 0.0
+
+    def _quitar(self, producto_id: int) -> None:
+        anterior = self._documentos.pop(producto_id, None)
+        if anterior is None:
+            return
+        terminos, longitud, _ = anterior
+        self._longitud_total -= longitud
+        for termino in terminos:
+            documentos = self._postings.get(termino)
+            if documentos is not None:
+                documentos.pop(producto_id, None)
+                if not documentos:
+                    del self._postings[termino]
+                    self._terminos_sucios = True
+
+    def indexar(self, producto_id: int, nombre: str, descripcion: Optional[str], activo: bool = True) -> None:
+        huella = hash((nombre, descripcion))
+        with self._lock:
+            anterior = self._documentos.get(producto_id)
+            if anterior is not None and anterior[2] == huella:
+                # Mismo texto (p. ej. un refresco tras una compra): solo puede cambiar `activo`
+                self._cambiar_activo([producto_id], activo)
+                return
+        frecuencias: Counter = Counter()
+        for termino in tokenizar(nombre):
+            frecuencias[termino] += PESO_NOMBRE
+        for termino in tokenizar(descripcion):
+            frecuencias[termino] += PESO_DESCRIPCION
+        longitud = sum(frecuencias.values())
+        with self._lock:
+            self._quitar(producto_id)
+            for termino, peso in frecuencias.items():
+                if termino not in self._postings:
+                    self._postings[termino] = {}
+                    self._terminos_sucios = True
+                self._postings[termino][producto_id] = peso
+            self._documentos[producto_id] = (tuple(frecuencias), longitud, huella)
+            self._longitud_total += longitud
+            self._cambiar_activo([producto_id], activo)
+
+    def _cambiar_activo(self, productos_ids: Iterable[int], activo: bool) -> None:
+        if activo:
+            self._inactivos.difference_update(productos_ids)
+        else:
+            self._inactivos.update(productos_ids)
+
+    def cambiar_activo(self, productos_ids: Iterable[int], activo: bool) -> None:
+        with self._lock:
+            self._cambiar_activo(productos_ids, activo)
+
+    def vaciar(self) -> None:
+        with self._lock:
+            self._reiniciar()
+
+    def _expandir(self, prefijo: str) -> list[str]:
+        if self._terminos_sucios:
+            self._terminos = sorted(self._postings)
+            self._terminos_sucios = False
+        inicio = bisect_left(self._terminos, prefijo)
+        encontrados = []
+        for termino in self._terminos[inicio:]:
+            if not termino.startswith(prefijo):
+                break
+            encontrados.append(termino)
+        return encontrados
+
+    def buscar(self, q: str) -> list[int]:
+        """IDs de productos activos que contienen todos los términos (por prefijo), por BM25."""
+        terminos = tokenizar(q)
+        if not terminos:
+            return []
+        with self._lock:
+            n = len(self._documentos)
+            if not n:
+                return []
+            promedio = self._longitud_total / n
+            puntajes: Optional[dict[int, float]] = None
+            for prefijo in terminos:
+                parcial: dict[int, float] = {}
+                for termino in self._expandir(prefijo):
+                    documentos = self._postings[termino]
+                    idf = math.log(1 + (n - len(documentos) + 0.5) / (len(documentos) + 0.5))
+                    for producto_id, tf in documentos.items():
+                        longitud = self._documentos[producto_id][1]
+                        norma = tf + self.K1 * (1 - self.B + self.B * longitud / promedio)
+                        parcial[producto_id] = parcial.get(producto_id, 0.0) + idf * tf * (self.K1 + 1) / norma
+                if puntajes is None:
+                    puntajes = parcial
+                else:
+                    puntajes = {i: p + parcial[i] for i, p in puntajes.items() if i in parcial}
+                if not puntajes:
+                    return []
+            candidatos = [(-p, i) for i, p in puntajes.items() if i not in self._inactivos]
+        candidatos.sort()
+        return [producto_id for _, producto_id in candidatos]
+
+
+indice = IndiceInvertido()
+
+# ======================
+# 🔄 INICIALIZACIÓN Y SINCRONIZACIÓN
+# ======================
+
+# `ultima_actualizacion` se fija antes del commit y una escritura puede esperar el
+# bloqueo (busy_timeout) antes de confirmarse con una fecha ya pasada: cada
+# refresco relee también este margen anterior al último
+MARGEN_REFRESCO = timedelta(seconds=30)
+
+# Desde cuándo hay que releer los productos modificados
+_refrescado_hasta: Optional[datetime] = None
+
+
+_COLUMNAS_INDICE = select(Producto.id, Producto.nombre, Producto.descripcion, Producto.activo)
+
+# Filas indexadas entre cesiones del bucle de eventos al construir o refrescar
+LOTE_INDEXADO = 1000
+
+
+def reconstruir_indice(engine) -> None:
+    """Recarga el índice en memoria desde la tabla producto, de una vez (benchmarks y scripts)."""
+    global _refrescado_hasta, INDICE_LISTO
+    _refrescado_hasta = datetime.utcnow()
+    indice.vaciar()
+    with Session(engine) as session:
+        for producto_id, nombre, descripcion, activo in session.exec(_COLUMNAS_INDICE):
+            indice.indexar(producto_id, nombre, descripcion, activo)
+    INDICE_LISTO = True
+
+
+async def construir_indice(session: AsyncSession) -> int:
+    """
+    Llena el índice en memoria desde la tabla producto, leyéndola en streaming
+    y cediendo el bucle de eventos cada LOTE_INDEXADO filas, y devuelve cuántas
+    indexó. Lo que cambie mientras tanto lo recoge el siguiente refresco.
+    """
+    global _refrescado_hasta, INDICE_LISTO
+    inicio = datetime.utcnow()
+    indice.vaciar()
+    total = 0
+    resultado = await session.stream(_COLUMNAS_INDICE.execution_options(yield_per=LOTE_INDEXADO))
+    async for lote in resultado.partitions():
+        for producto_id, nombre, descripcion, activo in lote:
+            indice.indexar(producto_id, nombre, descripcion, activo)
+        total += len(lote)
+        await asyncio.sleep(0)
+    _refrescado_hasta = inicio
+    INDICE_LISTO = True
+    return total
+
+
+def inicializar_busqueda(engine) -> str:
+    """
+    Elige el motor de búsqueda: FTS5 si las migraciones crearon la tabla
+    `producto_fts`; si no, el índice invertido en memoria, que construye
+    después `refrescar_periodicamente` sin retrasar el arranque del worker.
+    Solo lee: no ejecuta DDL.
+    """
+    global MODO, INDICE_LISTO
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conexion:
+            if existe_fts5(conexion):
+                MODO = "fts5"
+                return MODO
+    MODO = "memoria"
+    INDICE_LISTO = False
+    return MODO
+
+
+def producto_guardado(producto_id: int, nombre: str, descripcion: Optional[str], activo: bool) -> None:
+    """Tras crear/actualizar/(des)activar un producto. Con FTS5 lo hacen los triggers."""
+    if MODO == "memoria":
+        indice.indexar(producto_id, nombre, descripcion, activo)
+
+
+def productos_activados(productos_ids: Iterable[int], activo: bool) -> None:
+    """Tras la cascada de una categoría. Con FTS5 basta el filtro por `activo` de la consulta."""
+    if MODO == "memoria":
+        indice.cambiar_activo(productos_ids, activo)
+
+
+async def refrescar_indice(session: AsyncSession) -> int:
+    """
+    Reindexa los productos modificados desde el último refresco (con MARGEN_REFRESCO)
+    y devuelve cuántos leyó. Los que no cambiaron de texto solo actualizan `activo`.
+    """
+    global _refrescado_hasta
+    inicio = datetime.utcnow()
+    filas = (await session.exec(
+        _COLUMNAS_INDICE.where(Producto.ultima_actualizacion >= _refrescado_hasta - MARGEN_REFRESCO)
+    )).all()
+    for n, (producto_id, nombre, descripcion, activo) in enumerate(filas, 1):
+        indice.indexar(producto_id, nombre, descripcion, activo)
+        if n % LOTE_INDEXADO == 0:
+            # Tras una importación masiva: no retener el bucle de eventos del worker
+            await asyncio.sleep(0)
+    _refrescado_hasta = inicio
+    return len(filas)
+
+
+async def refrescar_periodicamente(fabrica_sesiones) -> None:
+    """
+    Tarea de fondo de cada worker con el índice en memoria (con FTS5 no hace
+    falta): primero lo construye y después lo refresca. Si la construcción
+    falla, la reintenta en la siguiente vuelta.
+    """
+    while True:
+        try:
+            async with fabrica_sesiones() as session:
+                if INDICE_LISTO:
+                    await refrescar_indice(session)
+                else:
+                    await construir_indice(session)
+        except Exception:
+            logger.exception("No se pudo construir o refrescar el índice de búsqueda en memoria")
+        await asyncio.sleep(config.BUSQUEDA_REFRESCO_SEGUNDOS)
@@ -0,0 +1,129 @@
+"""
+Caché en memoria (read-through) para las lecturas de categorías y productos.
+Cada caché es un LRU acotado con TTL; los endpoints que modifican datos
+invalidan solo las claves afectadas.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+import config
+
+# Parámetros por defecto del caché
+CACHE_TTL_SEGUNDOS = 30.0
+CACHE_MAX_ENTRADAS = 1024
+
+# Marca que distingue "no está en caché" de un valor guardado como None
+FALTA = object()
+
+# ======================
+# 🧠 CACHÉ LRU CON TTL
+# ======================
+
+class CacheLRU:
+    """
+    Diccionario LRU con expiración por entrada y contadores de aciertos y fallos.
+
+    Lo usan los endpoints async, en el único bucle de eventos de cada worker, y
+    ningún método hace `await`: cada llamada se completa sin que otra corrutina
+    se intercale. El lock solo cubre a los endpoints síncronos de monitoreo
+    (`/cache/estadisticas`, `/metrics`), que leen las estadísticas desde el
+    threadpool. El caché es de cada proceso: las invalidaciones de un worker no
+    llegan a los demás, que sirven su copia hasta que vence el TTL.
+    """
+
+    def __init__(self, nombre: str, max_entradas: int = CACHE_MAX_ENTRADAS, ttl: float = CACHE_TTL_SEGUNDOS):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave: Hashable) -> Any:
+        """Devuelve el valor guardado o `FALTA` si no existe o ya expiró."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return FALTA
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *claves: Hashable) -> None:
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+
+# ======================
+# 🗂️ CACHÉS DE LA TIENDA
+# ======================
+
+productos_por_id = CacheLRU("productos_por_id")
+listados_productos = CacheLRU("listados_productos")
+categorias_por_id = CacheLRU("categorias_por_id")
+listado_categorias = CacheLRU("listado_categorias", max_entradas=1)
+# Frente en memoria de la tabla de idempotencia: los reintentos de una tormenta no llegan a la base
+respuestas_idempotentes = CacheLRU("respuestas_idempotentes", ttl=config.IDEMPOTENCIA_TTL_SEGUNDOS)
+
+CACHES = (productos_por_id, listados_productos, categorias_por_id, listado_categorias, respuestas_idempotentes)
+
+
+def estadisticas() -> dict:
+    return {cache.nombre: cache.estadisticas() for cache in CACHES}
+
+
+# ======================
+# 🧹 INVALIDACIÓN
+# ======================
+
+def invalidar_producto(producto_id: Optional[int], *categoria_ids: int) -> None:
+    """
+    Un producto cambió: se descartan su entrada, los listados de productos
+    (cualquier filtro puede incluirlo) y el detalle de las categorías que lo embeben.
+    """
+    if producto_id is not None:
+        productos_por_id.invalidar(producto_id)
+    listados_productos.limpiar()
+    categorias_por_id.invalidar(*categoria_ids)
+
+
+def invalidar_categoria(categoria_id: int, productos_ids: tuple = (), cascada: bool = False) -> None:
+    """
+    Una categoría cambió. Con `cascada` también cambiaron sus productos,
+    así que se descartan sus entradas y los listados de productos.
+    """
+    categorias_por_id.invalidar(categoria_id)
+    listado_categorias.limpiar()
+    if cascada:
+        productos_por_id.invalidar(*productos_ids)
+        listados_productos.limpiar()
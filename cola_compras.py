@@ -0,0 +1,213 @@
+"""
+Cola de compras con commit agrupado (write-behind) para picos de tráfico.
+
+En una venta flash cada `comprar_producto` hacía su propio commit y todas
+las peticiones se disputaban el bloqueo de escritura de SQLite. Con
+COMPRAS_AGRUPADAS activado las compras individuales se encolan y una única
+tarea escritora por worker las aplica en lotes de hasta COMPRAS_LOTE_MAXIMO,
+esperando como mucho COMPRAS_LOTE_ESPERA_MS a que se junten, con un solo
+commit por lote.
+
+El lote lee sus productos con una consulta, decide en orden de llegada qué
+compras caben en el stock y descuenta el total de cada producto con el mismo
+UPDATE condicional de `inventario` (nunca sobrevende). Una compra sin stock
+se rechaza sin afectar a las demás y el futuro de cada petición recibe su
+propio resultado. Si falla el commit, todas las compras del lote reciben el
+error y ninguna se aplica.
+"""
+
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+from sqlmodel import select
+import cache
+import condicionales
+import config
+import estadisticas
+import idempotencia
+from db import AsyncSessionLocal
+from inventario import descontar_stock, sentencia_reposicion
+from models import Producto
+from schemas import ProductoRead
+
+logger = logging.getLogger(__name__)
+
+
+class Compra(NamedTuple):
+    producto_id: int
+    cantidad: int
+    registro: Optional[idempotencia.Registro]
+    futuro: asyncio.Future
+
+
+_cola: Optional[asyncio.Queue] = None
+_escritor: Optional[asyncio.Task] = None
+
+# ======================
+# 📥 ENCOLAR
+# ======================
+
+def activa() -> bool:
+    return _escritor is not None
+
+
+def pendientes() -> int:
+    return _cola.qsize() if _cola is not None else 0
+
+
+async def comprar(producto_id: int, cantidad: int, registro: Optional[idempotencia.Registro] = None) -> Optional[ProductoRead]:
+    """
+    Encola la compra y espera al commit de su lote. Devuelve el producto
+    actualizado o None si no se pudo descontar (inactivo, inexistente o sin stock).
+    Si la petición se cancela antes de que el lote la procese, la compra no se aplica.
+    """
+    futuro = asyncio.get_running_loop().create_future()
+    _cola.put_nowait(Compra(producto_id, cantidad, registro, futuro))
+    return await futuro
+
+# ======================
+# ✍️ ESCRITOR
+# ======================
+
+def _sacar_disponibles(lote: list) -> None:
+    while len(lote) < config.COMPRAS_LOTE_MAXIMO and not _cola.empty():
+        lote.append(_cola.get_nowait())
+
+
+async def _confirmar_clave(session, compra: Compra, respuesta: ProductoRead):
+    """Guarda la respuesta de una compra con Idempotency-Key; si otro worker ya la guardó, devuelve el stock."""
+    if compra.registro is None or await idempotencia.registrar_si_libre(session, compra.registro, respuesta):
+        return respuesta
+    await session.exec(sentencia_reposicion(compra.producto_id, compra.cantidad))
+    return idempotencia.ClaveOcupada()
+
+
+async def _aplicar_por_producto(session, lote: list[Compra]) -> Optional[list]:
+    """
+    Camino rápido: lee los productos del lote con una consulta, decide en orden
+    qué compras caben en el stock y descuenta el total de cada producto con un
+    único UPDATE condicional. Si el stock cambió entre la lectura y el UPDATE
+    (otro worker), devuelve None y el lote se aplica compra a compra.
+    """
+    ids = sorted({compra.producto_id for compra in lote})
+    disponibles = {
+        producto_id: stock
+        for producto_id, stock, activo in await session.exec(
+            select(Producto.id, Producto.stock, Producto.activo).where(Producto.id.in_(ids))
+        )
+        if activo
+    }
+    totales: dict[int, int] = {}
+    acumulados: list[Optional[int]] = []
+    for compra in lote:
+        restante = disponibles.get(compra.producto_id)
+        if restante is None or restante < compra.cantidad:
+            acumulados.append(None)
+            continue
+        disponibles[compra.producto_id] = restante - compra.cantidad
+        totales[compra.producto_id] = totales.get(compra.producto_id, 0) + compra.cantidad
+        acumulados.append(totales[compra.producto_id])
+
+    actualizados = {}
+    for producto_id in sorted(totales):
+        producto = await descontar_stock(session, producto_id, totales[producto_id])
+        if producto is None:
+            await session.rollback()
+            return None
+        actualizados[producto_id] = (ProductoRead.model_validate(producto), estadisticas.estado(producto))
+
+    resultados = []
+    repuesto = dict.fromkeys(totales, 0)
+    for compra, acumulado in zip(lote, acumulados):
+        if acumulado is None:
+            resultados.append(None)
+            continue
+        # Stock justo después de esta compra, como si el lote se aplicara en orden
+        final = actualizados[compra.producto_id][0]
+        respuesta = final.model_copy(update={"stock": final.stock + totales[compra.producto_id] - acumulado})
+        resultado = await _confirmar_clave(session, compra, respuesta)
+        if not isinstance(resultado, ProductoRead):
+            repuesto[compra.producto_id] += compra.cantidad
+        resultados.append(resultado)
+    await estadisticas.aplicar_cambios(session, [
+        (estado._replace(stock=estado.stock + totales[producto_id]), estado._replace(stock=estado.stock + repuesto[producto_id]))
+        for producto_id, (_, estado) in actualizados.items()
+    ])
+    return resultados
+
+
+async def _aplicar_una_a_una(session, lote: list[Compra]) -> list:
+    resultados = []
+    cambios = []
+    for compra in lote:
+        producto = await descontar_stock(session, compra.producto_id, compra.cantidad)
+        if producto is None:
+            resultados.append(None)
+            continue
+        resultado = await _confirmar_clave(session, compra, ProductoRead.model_validate(producto))
+        if isinstance(resultado, ProductoRead):
+            despues = estadisticas.estado(producto)
+            cambios.append((despues._replace(stock=despues.stock + compra.cantidad), despues))
+        resultados.append(resultado)
+    await estadisticas.aplicar_cambios(session, cambios)
+    return resultados
+
+
+async def _aplicar(lote: list[Compra]) -> list:
+    """Aplica el lote en una transacción y devuelve el resultado de cada compra, sin resolver los futuros."""
+    async with AsyncSessionLocal() as session:
+        resultados = await _aplicar_por_producto(session, lote)
+        if resultados is None:
+            resultados = await _aplicar_una_a_una(session, lote)
+        await condicionales.avanzar_version(session)
+        await session.commit()
+    for compra, resultado in zip(lote, resultados):
+        if isinstance(resultado, ProductoRead):
+            cache.invalidar_producto(compra.producto_id, resultado.categoria_id)
+    return resultados
+
+
+async def _escribir() -> None:
+    espera = config.COMPRAS_LOTE_ESPERA_MS / 1000
+    while True:
+        lote = [await _cola.get()]
+        _sacar_disponibles(lote)
+        if len(lote) < config.COMPRAS_LOTE_MAXIMO and espera > 0:
+            await asyncio.sleep(espera)
+            _sacar_disponibles(lote)
+        # Las peticiones canceladas mientras esperaban no se aplican
+        vigentes = [compra for compra in lote if not compra.futuro.done()]
+        try:
+            resultados = await _aplicar(vigentes) if vigentes else []
+        except Exception as exc:
+            logger.warning("Falló el lote de %d compras: %s", len(vigentes), exc)
+            resultados = [exc] * len(vigentes)
+        for compra, resultado in zip(vigentes, resultados):
+            if compra.futuro.done():
+                continue
+            if isinstance(resultado, Exception):
+                compra.futuro.set_exception(resultado)
+            else:
+                compra.futuro.set_result(resultado)
+        for _ in lote:
+            _cola.task_done()
+
+
+# ======================
+# 🚦 ARRANQUE Y PARADA
+# ======================
+
+def iniciar() -> None:
+    global _cola, _escritor
+    _cola = asyncio.Queue()
+    _escritor = asyncio.create_task(_escribir())
+
+
+async def detener() -> None:
+    """Aplica las compras ya encoladas y para el escritor."""
+    global _escritor
+    if _escritor is None:
+        return
+    escritor, _escritor = _escritor, None
+    await _cola.join()
+    escritor.cancel()
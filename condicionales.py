@@ -0,0 +1,176 @@
+"""
+Peticiones condicionales HTTP (ETag / Last-Modified) para las lecturas del catálogo.
+
+- Un producto se identifica por su versión de fila: `ultima_actualizacion`,
+  que cambia en cada escritura (edición, compra, activación, cascada).
+- Los listados y las categorías dependen de muchas filas, así que usan la
+  versión del catálogo: un contador (tabla `catalogo_version`) que cualquier
+  escritura de productos o categorías avanza en su propia transacción,
+  también las que sacan una fila de un filtro. Una sola lectura.
+
+Las fechas de `ultima_actualizacion` no sirven como versión del catálogo: se
+toman antes de esperar el bloqueo de escritura, así que una escritura puede
+confirmarse con una fecha anterior a otra ya visible, y un MAX no cambiaría.
+Cada escritura confirmada suma uno al contador, así que la versión visible
+crece con cada commit.
+
+Con `If-None-Match` (o `If-Modified-Since` si no hay ETag) coincidente se
+responde `304 Not Modified` sin cuerpo; cuando la versión se calcula antes
+del listado, tampoco se ejecuta la consulta. `Cache-Control` permite que un
+CDN o proxy inverso absorba el tráfico de navegación.
+"""
+
+import random
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import func, select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+import config
+from models import VersionCatalogo
+
+_EPOCA = datetime(1970, 1, 1)
+
+CACHE_CONTROL = (
+    f"public, max-age={config.HTTP_CACHE_MAX_AGE}, "
+    f"stale-while-revalidate={config.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+    if config.HTTP_CACHE_MAX_AGE > 0 else "no-cache"
+)
+
+# ======================
+# 🏷️ VALIDADORES
+# ======================
+
+class Validadores(NamedTuple):
+    """ETag fuerte y fecha de última modificación de una representación."""
+    etag: str
+    ultima_modificacion: datetime
+
+
+def _microsegundos(momento: Optional[datetime]) -> int:
+    return int(((momento or _EPOCA) - _EPOCA).total_seconds() * 1_000_000)
+
+
+def validadores_producto(producto_id: int, ultima_actualizacion: datetime) -> Validadores:
+    return Validadores(f'"p{producto_id}-{_microsegundos(ultima_actualizacion):x}"', ultima_actualizacion)
+
+
+_VERSION_CATALOGO = select(func.sum(VersionCatalogo.version), func.max(VersionCatalogo.actualizada))
+
+
+async def version_catalogo(session: AsyncSession) -> Validadores:
+    """Validadores de cualquier representación que dependa de varios productos o categorías."""
+    version, actualizada = (await session.exec(_VERSION_CATALOGO)).one()
+    # SUM de BIGINT es NUMERIC en PostgreSQL (llega como Decimal)
+    return Validadores(f'"c{int(version):x}"', actualizada)
+
+# ======================
+# 🔢 AVANCE DE LA VERSIÓN
+# ======================
+# El contador está repartido en FRAGMENTOS_VERSION filas y la versión es su
+# suma. En SQLite lo avanzan triggers sobre `producto` y `categoria` (siempre
+# en la fila 1: las escrituras ya van de una en una), que cubren también las
+# importaciones y las cargas directas en la base. En otros motores, los
+# endpoints llaman a `avanzar_version` antes del commit, que avanza una fila
+# al azar: el UPDATE la bloquea hasta el commit, y con una sola fila todas las
+# compras y escrituras de todos los workers esperaban en cola a la anterior.
+# Así dos transacciones solo se esperan si eligen la misma fila. Las compras
+# también la avanzan: el stock forma parte de los listados y de sus filtros.
+# `actualizada` nunca retrocede en una fila, y se lee su máximo.
+
+FRAGMENTOS_VERSION = 64
+
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+_DDL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS catalogo_version_{tabla}_{sufijo} AFTER {evento} ON {tabla} BEGIN
+        UPDATE catalogo_version SET version = version + 1, actualizada = MAX(actualizada, {_AHORA}) WHERE id = 1;
+    END
+    """
+    for tabla in ("producto", "categoria")
+    for sufijo, evento in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+]
+
+_AVANZAR = text("""
+UPDATE catalogo_version SET
+    version = version + 1,
+    actualizada = CASE WHEN actualizada > :ahora THEN actualizada ELSE :ahora END
+WHERE id = :fragmento""")
+
+
+def crear_version(conexion) -> None:
+    """
+    Crea las filas del contador que falten y, en SQLite, sus triggers. Es DDL:
+    lo ejecutan las migraciones. El contador empieza en los microsegundos
+    actuales, para que una base recreada no repita los ETag que guardan los clientes.
+    """
+    VersionCatalogo.__table__.create(conexion, checkfirst=True)
+    existentes = set(conexion.execute(select(VersionCatalogo.id)).scalars())
+    ahora = datetime.utcnow()
+    filas = [
+        {"id": fragmento, "version": _microsegundos(ahora) if fragmento == 1 else 0, "actualizada": ahora}
+        for fragmento in range(1, FRAGMENTOS_VERSION + 1)
+        if fragmento not in existentes
+    ]
+    if filas:
+        conexion.execute(VersionCatalogo.__table__.insert(), filas)
+    if mantenida_por_triggers(conexion.dialect.name):
+        for sentencia in _DDL_TRIGGERS:
+            conexion.execute(text(sentencia))
+
+
+def mantenida_por_triggers(dialecto: str) -> bool:
+    return dialecto == "sqlite"
+
+
+async def avanzar_version(session: AsyncSession) -> None:
+    """
+    Avanza la versión del catálogo en la transacción de `session`, salvo que
+    ya lo hagan los triggers. Conviene llamarla justo antes del commit, para
+    bloquear la fila el menor tiempo posible. No hace commit.
+    """
+    if mantenida_por_triggers(session.bind.dialect.name):
+        return
+    fragmento = random.randint(1, FRAGMENTOS_VERSION)
+    await session.exec(_AVANZAR, params={"fragmento": fragmento, "ahora": datetime.utcnow()})
+
+# ======================
+# 🔁 COMPARACIÓN Y RESPUESTAS
+# ======================
+
+def no_modificado(request: Request, validadores: Validadores) -> bool:
+    """
+    Evalúa If-None-Match y, solo si no viene, If-Modified-Since (RFC 9110 §13.2.2).
+    If-None-Match usa comparación débil: se ignora el prefijo W/.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = {etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")}
+        return "*" in etiquetas or validadores.etag in etiquetas
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        return False
+    # Last-Modified tiene resolución de segundos
+    ultima = validadores.ultima_modificacion.replace(microsecond=0, tzinfo=timezone.utc)
+    return ultima <= desde
+
+
+def cabeceras(validadores: Validadores) -> dict:
+    return {
+        "ETag": validadores.etag,
+        "Last-Modified": format_datetime(validadores.ultima_modificacion.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+
+
+def respuesta_no_modificado(validadores: Validadores) -> Response:
+    return Response(status_code=304, headers=cabeceras(validadores))
@@ -1,15 +1,156 @@
 """
 Módulo de configuración de la base de datos para la Tienda Online.
-Usa SQLModel (basado en SQLAlchemy) y SQLite como motor local.
+Usa SQLModel (basado en SQLAlchemy) y SQLite como motor local;
+también puede apuntar a PostgreSQL cambiando DATABASE_URL (ver config.py).
+
+Las rutas que escriben usan la base primaria y las GET un motor de lectura
+aparte: réplicas (DATABASE_REPLICA_URLS) o, sin ellas, un pool propio de solo
+lectura sobre la primaria, para que la navegación no ocupe las conexiones de
+las compras.
 """
 
+import itertools
+import time
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+import config
+import metricas
+
+# URL de la base de datos (SQLite local por defecto)
+DATABASE_URL = config.DATABASE_URL
+
+
+def _es_sqlite_en_memoria(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _configurar_sqlite(engine) -> None:
+    """
+    Aplica los PRAGMAs de rendimiento a cada conexión nueva:
+    WAL para que los lectores no esperen a los escritores, synchronous=NORMAL
+    (seguro con WAL), busy_timeout para reintentar en vez de fallar y mmap.
+    """
+    @event.listens_for(engine, "connect")
+    def _pragmas(conexion_dbapi, _registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.close()
+
+
+def _solo_lectura_sqlite(engine) -> None:
+    """Después de los PRAGMAs de rendimiento: la conexión rechaza cualquier escritura."""
+    @event.listens_for(engine, "connect")
+    def _query_only(conexion_dbapi, _registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _instrumentar(engine) -> None:
+    """
+    Mide cada sentencia SQL para las métricas (ver metricas.py).
+    El inicio se guarda en el contexto de ejecución, así no hace falta una pila por conexión.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _inicio(conexion, cursor, sentencia, parametros, contexto, executemany):
+        contexto._inicio_metricas = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _fin(conexion, cursor, sentencia, parametros, contexto, executemany):
+        metricas.registrar_consulta(time.perf_counter() - contexto._inicio_metricas)
+
+
+def _parametros_engine(url_parseada, opciones: dict) -> dict:
+    parametros = {"echo": config.DB_ECHO, "pool_pre_ping": config.DB_POOL_PRE_PING}
+    if not _es_sqlite_en_memoria(url_parseada):
+        parametros.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
+    parametros.update(opciones)
+    return parametros
+
+
+def crear_engine(url: str = DATABASE_URL, **opciones):
+    """
+    Construye un motor según la configuración: pool dimensionado,
+    pre-ping y sin eco de SQL salvo que se pida con DB_ECHO.
+    """
+    url_parseada = make_url(url)
+    engine = create_engine(url, **_parametros_engine(url_parseada, opciones))
+    if url_parseada.get_backend_name() == "sqlite":
+        _configurar_sqlite(engine)
+    if config.METRICAS_HABILITADAS:
+        _instrumentar(engine)
+    return engine
+
+
+def url_asincrona(url: str) -> str:
+    """Traduce una URL síncrona al driver asíncrono equivalente (aiosqlite / asyncpg)."""
+    url_parseada = make_url(url)
+    backend = url_parseada.get_backend_name()
+    if backend == "sqlite":
+        url_parseada = url_parseada.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql":
+        url_parseada = url_parseada.set(drivername="postgresql+asyncpg")
+    return url_parseada.render_as_string(hide_password=False)
+
+
+def crear_async_engine(url: str, solo_lectura: bool = False, **opciones):
+    """
+    Versión asíncrona de `crear_engine`, con el mismo pool y los mismos PRAGMAs.
+    Con `solo_lectura` las conexiones no admiten escrituras (query_only en SQLite,
+    transacciones READ ONLY en PostgreSQL).
+    """
+    url_parseada = make_url(url)
+    backend = url_parseada.get_backend_name()
+    if solo_lectura and backend == "postgresql":
+        opciones.setdefault("execution_options", {"postgresql_readonly": True})
+    engine = create_async_engine(url, **_parametros_engine(url_parseada, opciones))
+    if backend == "sqlite":
+        _configurar_sqlite(engine.sync_engine)
+        if solo_lectura:
+            _solo_lectura_sqlite(engine.sync_engine)
+    if config.METRICAS_HABILITADAS:
+        _instrumentar(engine.sync_engine)
+    return engine
 
-# Nombre del archivo de base de datos local
-DATABASE_URL = "sqlite:///tienda.db"
 
 # Se crea el motor de conexión
-engine = create_engine(DATABASE_URL, echo=True)
+engine = crear_engine(DATABASE_URL)
+
+# Motor asíncrono usado por los endpoints
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL or url_asincrona(DATABASE_URL)
+async_engine = crear_async_engine(ASYNC_DATABASE_URL)
+
+# expire_on_commit=False: tras el commit no se puede recargar de forma perezosa en async
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Motores de lectura de las rutas GET: las réplicas o, sin ellas, un pool de solo
+# lectura sobre la primaria (una base SQLite en memoria no se puede abrir dos veces)
+LECTURA_EN_REPLICAS = bool(config.DATABASE_REPLICA_URLS)
+if LECTURA_EN_REPLICAS:
+    async_engines_lectura = [crear_async_engine(url_asincrona(url), solo_lectura=True) for url in config.DATABASE_REPLICA_URLS]
+elif _es_sqlite_en_memoria(make_url(ASYNC_DATABASE_URL)):
+    async_engines_lectura = [async_engine]
+else:
+    async_engines_lectura = [crear_async_engine(ASYNC_DATABASE_URL, solo_lectura=True)]
+_sesiones_lectura = itertools.cycle([
+    async_sessionmaker(motor, class_=AsyncSession, expire_on_commit=False) for motor in async_engines_lectura
+])
+
+# Cookie con el instante (epoch) hasta el que el cliente lee de la primaria tras escribir
+COOKIE_LEER_PRIMARIA = "tienda_leer_primaria"
 
 def create_db_and_tables():
     """
@@ -25,3 +166,54 @@ def get_session():
     """
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    """
+    Variante asíncrona de `get_session`: los endpoints `async def` esperan
+    la E/S de la base de datos sin ocupar un hilo del threadpool.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def lee_de_primaria(request: Optional[Request]) -> bool:
+    """
+    True si hay réplicas y el cliente escribió hace menos de
+    DB_LEER_PRIMARIA_TRAS_ESCRIBIR segundos. Sus lecturas van a la primaria y
+    no consultan los cachés del worker: otro cliente pudo llenarlos desde una
+    réplica que aún no tenía su escritura.
+    """
+    if request is None or not LECTURA_EN_REPLICAS:
+        return False
+    try:
+        return float(request.cookies.get(COOKIE_LEER_PRIMARIA, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def sesion_lectura(request: Optional[Request] = None) -> AsyncSession:
+    """Sesión de lectura: alterna entre las réplicas, o la primaria si `lee_de_primaria`."""
+    if lee_de_primaria(request):
+        return AsyncSessionLocal()
+    return next(_sesiones_lectura)()
+
+
+async def get_async_session_lectura(request: Request):
+    """Dependencia de las rutas GET: sesión sobre el motor de lectura."""
+    async with sesion_lectura(request) as session:
+        yield session
+
+
+async def get_async_session_escritura(response: Response):
+    """
+    Dependencia de las rutas que modifican datos: sesión sobre la primaria.
+    Con réplicas, fija al cliente a la primaria durante DB_LEER_PRIMARIA_TRAS_ESCRIBIR
+    segundos para que lea sus propias escrituras.
+    """
+    if LECTURA_EN_REPLICAS and config.DB_LEER_PRIMARIA_TRAS_ESCRIBIR > 0:
+        response.set_cookie(
+            COOKIE_LEER_PRIMARIA, f"{time.time() + config.DB_LEER_PRIMARIA_TRAS_ESCRIBIR:.3f}",
+            max_age=max(1, round(config.DB_LEER_PRIMARIA_TRAS_ESCRIBIR)), httponly=True, samesite="lax",
+        )
+    async with AsyncSessionLocal() as session:
+        yield session
@@ -0,0 +1,345 @@
+"""
+Estadísticas precalculadas por categoría (tabla `categoria_stats`).
+
+Cada escritura que cambia productos activos (altas, ediciones, activaciones,
+compras, importaciones y cascadas de categoría) aplica sus diferencias a la
+fila de la categoría dentro de la misma transacción, así que leer las
+estadísticas es una búsqueda por clave primaria sin importar el tamaño del
+catálogo. En SQLite lo hacen triggers; en otros motores, los endpoints con
+`aplicar_cambios`. El mínimo y el máximo de precio se recalculan con el
+índice (categoria_id, precio) solo cuando cambia algún precio activo.
+
+Reconstrucción completa y comprobación de consistencia:
+    python estadisticas.py              # recalcula la tabla entera
+    python estadisticas.py --verificar  # compara sin modificar (sale con 1 si difiere)
+"""
+
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional
+from sqlalchemy import DateTime, and_, delete, func, insert, literal, select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Categoria, CategoriaEstadisticas, Producto
+
+TABLA = CategoriaEstadisticas.__table__
+COLUMNAS = ("productos_activos", "stock_total", "valor_inventario", "precio_min", "precio_max")
+
+# ======================
+# 📸 ESTADO DE UN PRODUCTO
+# ======================
+
+class EstadoProducto(NamedTuple):
+    """Los campos de un producto que intervienen en las estadísticas."""
+    categoria_id: int
+    activo: bool
+    precio: float
+    stock: int
+
+
+def estado(producto: Producto) -> EstadoProducto:
+    return EstadoProducto(producto.categoria_id, producto.activo, producto.precio, producto.stock)
+
+
+def _clave_precio(estado_producto: Optional[EstadoProducto]) -> Optional[tuple]:
+    if estado_producto is None or not estado_producto.activo:
+        return None
+    return estado_producto.categoria_id, estado_producto.precio
+
+# ======================
+# 🧮 CONSULTAS DE AGREGACIÓN
+# ======================
+
+def consulta_agregados(categoria_id: Optional[int] = None):
+    """
+    Agregados calculados desde cero, una fila por categoría (con ceros si no
+    tiene productos activos). Es la referencia para reconstruir y verificar.
+    """
+    query = (
+        select(
+            Categoria.id.label("categoria_id"),
+            func.count(Producto.id).label("productos_activos"),
+            func.coalesce(func.sum(Producto.stock), 0).label("stock_total"),
+            func.coalesce(func.sum(Producto.precio * Producto.stock), 0.0).label("valor_inventario"),
+            func.min(Producto.precio).label("precio_min"),
+            func.max(Producto.precio).label("precio_max"),
+        )
+        .outerjoin(Producto, and_(Producto.categoria_id == Categoria.id, Producto.activo == True))
+        .group_by(Categoria.id)
+        .order_by(Categoria.id)
+    )
+    if categoria_id is not None:
+        query = query.where(Categoria.id == categoria_id)
+    return query
+
+
+def sentencias_reconstruccion(categoria_id: Optional[int] = None) -> list:
+    """DELETE + INSERT ... SELECT que rehacen la tabla (o la fila de una categoría)."""
+    borrado = delete(TABLA)
+    if categoria_id is not None:
+        borrado = borrado.where(TABLA.c.categoria_id == categoria_id)
+    agregados = consulta_agregados(categoria_id).add_columns(literal(datetime.utcnow(), DateTime).label("actualizado"))
+    return [borrado, insert(TABLA).from_select(["categoria_id", *COLUMNAS, "actualizado"], agregados)]
+
+# ======================
+# 🗃️ TRIGGERS (SQLITE)
+# ======================
+# En SQLite la tabla la mantienen triggers sobre `producto` y `categoria`: el
+# ajuste ocurre dentro de la misma sentencia que modifica el producto, sin
+# otra ida y vuelta a la base mientras se tiene el bloqueo de escritura
+# (una sentencia extra por compra alargaba ese bloqueo y las compras
+# concurrentes agotaban el busy_timeout). Cubre también las cargas masivas
+# que no pasan por los endpoints.
+
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _ajustar(categoria: str, *filas: tuple[str, str]) -> str:
+    """
+    UPDATE por clave primaria que suma (+) o resta (-) las filas `new`/`old`
+    a una categoría. `activo` vale 0/1, así que una fila inactiva no aporta.
+    La fila de la categoría siempre existe (la crea el trigger de categoria).
+    """
+    def termino(valor: str) -> str:
+        return " ".join(f"{signo} {fila}.activo * {valor.format(f=fila)}" for fila, signo in filas)
+    return f"""
+        UPDATE categoria_stats SET
+            productos_activos = productos_activos {termino("1")},
+            stock_total = stock_total {termino("{f}.stock")},
+            valor_inventario = valor_inventario {termino("{f}.precio * {f}.stock")},
+            actualizado = {_AHORA}
+        WHERE categoria_id = {categoria};"""
+
+
+# Añadir un precio activo solo puede bajar el mínimo o subir el máximo
+_AMPLIAR_EXTREMOS = """
+        UPDATE categoria_stats SET
+            precio_min = MIN(IFNULL(precio_min, new.precio), new.precio),
+            precio_max = MAX(IFNULL(precio_max, new.precio), new.precio)
+        WHERE categoria_id = new.categoria_id AND new.activo;"""
+
+# Quitar un precio solo obliga a recalcular si era uno de los extremos. MIN y
+# MAX en subconsultas separadas: así SQLite salta al extremo del índice
+# (categoria_id, precio) y avanza hasta el primer activo en lugar de
+# recorrer la categoría.
+_RECALCULAR_EXTREMOS = """
+        UPDATE categoria_stats SET
+            precio_min = (SELECT MIN(precio) FROM producto WHERE activo = 1 AND categoria_id = old.categoria_id),
+            precio_max = (SELECT MAX(precio) FROM producto WHERE activo = 1 AND categoria_id = old.categoria_id)
+        WHERE categoria_id = old.categoria_id AND old.activo
+          AND (old.precio <= precio_min OR old.precio >= precio_max);"""
+
+_DDL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_categoria_ai AFTER INSERT ON categoria BEGIN
+        INSERT OR IGNORE INTO categoria_stats (categoria_id, productos_activos, stock_total, valor_inventario, actualizado)
+        VALUES (new.id, 0, 0, 0.0, {_AHORA});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_producto_ai AFTER INSERT ON producto WHEN new.activo BEGIN
+        {_ajustar("new.categoria_id", ("new", "+"))}
+        {_AMPLIAR_EXTREMOS}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_producto_ad AFTER DELETE ON producto WHEN old.activo BEGIN
+        {_ajustar("old.categoria_id", ("old", "-"))}
+        {_RECALCULAR_EXTREMOS}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_producto_au
+    AFTER UPDATE OF activo, precio, stock, categoria_id ON producto
+    WHEN (old.activo OR new.activo) AND old.categoria_id = new.categoria_id BEGIN
+        {_ajustar("new.categoria_id", ("old", "-"), ("new", "+"))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_producto_au_categoria
+    AFTER UPDATE OF categoria_id ON producto
+    WHEN (old.activo OR new.activo) AND old.categoria_id IS NOT new.categoria_id BEGIN
+        {_ajustar("old.categoria_id", ("old", "-"))}
+        {_ajustar("new.categoria_id", ("new", "+"))}
+    END
+    """,
+    # Las compras solo cambian el stock: este trigger ni se evalúa
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categoria_stats_producto_au_precios
+    AFTER UPDATE OF activo, precio, categoria_id ON producto
+    WHEN (old.activo OR new.activo) AND (
+        old.activo IS NOT new.activo OR old.precio IS NOT new.precio OR old.categoria_id IS NOT new.categoria_id
+    ) BEGIN
+        {_RECALCULAR_EXTREMOS}
+        {_AMPLIAR_EXTREMOS}
+    END
+    """,
+]
+
+
+def crear_triggers(conexion) -> None:
+    """Crea los triggers de mantenimiento si no existen. Es DDL: lo ejecutan las migraciones."""
+    for sentencia in _DDL_TRIGGERS:
+        conexion.execute(text(sentencia))
+
+
+def mantenida_por_triggers(dialecto: str) -> bool:
+    return dialecto == "sqlite"
+
+# ======================
+# 🔁 MANTENIMIENTO DESDE LA APLICACIÓN
+# ======================
+# Para los motores sin los triggers anteriores, los endpoints pasan los
+# cambios de cada escritura y se aplican como upserts en su transacción.
+# SQL fijo en vez de los insert().on_conflict_do_update() de cada dialecto:
+# esos no entran en la caché de compilación de SQLAlchemy y compilarlos en
+# cada escritura costaba más que ejecutarlos.
+
+_UPSERT = """
+INSERT INTO categoria_stats
+    (categoria_id, productos_activos, stock_total, valor_inventario, precio_min, precio_max, actualizado)
+VALUES (
+    :categoria_id, :productos_activos, :stock_total, :valor_inventario,
+    (SELECT MIN(precio) FROM producto WHERE activo = TRUE AND categoria_id = :categoria_id),
+    (SELECT MAX(precio) FROM producto WHERE activo = TRUE AND categoria_id = :categoria_id),
+    :actualizado
+)
+ON CONFLICT (categoria_id) DO UPDATE SET
+    productos_activos = categoria_stats.productos_activos + excluded.productos_activos,
+    stock_total = categoria_stats.stock_total + excluded.stock_total,
+    valor_inventario = categoria_stats.valor_inventario + excluded.valor_inventario,
+    actualizado = excluded.actualizado"""
+
+UPSERT_SUMAS = text(_UPSERT)
+UPSERT_SUMAS_Y_EXTREMOS = text(_UPSERT + """,
+    precio_min = excluded.precio_min,
+    precio_max = excluded.precio_max""")
+
+
+def sentencias_cambios(cambios: Iterable[tuple[Optional[EstadoProducto], Optional[EstadoProducto]]]) -> list[tuple]:
+    """
+    Traduce pares (antes, después) de productos a pares (sentencia, parámetros)
+    con un upsert por categoría afectada. `None` significa que el producto no
+    existía (alta). Las sumas se aplican como incrementos sobre la fila
+    existente; el mínimo y el máximo solo se reescriben si cambió algún precio
+    activo de la categoría.
+    """
+    deltas: dict[int, list] = {}
+    extremos: set[int] = set()
+    for antes, despues in cambios:
+        for estado_producto, signo in ((antes, -1), (despues, 1)):
+            if estado_producto is None or not estado_producto.activo:
+                continue
+            delta = deltas.setdefault(estado_producto.categoria_id, [0, 0, 0.0])
+            delta[0] += signo
+            delta[1] += signo * estado_producto.stock
+            delta[2] += signo * estado_producto.precio * estado_producto.stock
+        clave_antes, clave_despues = _clave_precio(antes), _clave_precio(despues)
+        if clave_antes != clave_despues:
+            extremos.update(clave[0] for clave in (clave_antes, clave_despues) if clave)
+
+    ahora = datetime.utcnow()
+    sentencias = []
+    for categoria_id in sorted(deltas.keys() | extremos):
+        activos, stock, valor = deltas.get(categoria_id, (0, 0, 0.0))
+        if not (activos or stock or valor) and categoria_id not in extremos:
+            continue  # p. ej. solo cambió el nombre
+        parametros = {
+            "categoria_id": categoria_id, "productos_activos": activos, "stock_total": stock,
+            "valor_inventario": valor, "actualizado": ahora,
+        }
+        sentencia = UPSERT_SUMAS_Y_EXTREMOS if categoria_id in extremos else UPSERT_SUMAS
+        sentencias.append((sentencia, parametros))
+    return sentencias
+
+
+async def aplicar_cambios(session: AsyncSession, cambios: Iterable[tuple[Optional[EstadoProducto], Optional[EstadoProducto]]]) -> None:
+    """
+    Aplica los cambios a `categoria_stats` en la transacción de `session`,
+    salvo que ya lo hagan los triggers. No hace commit.
+    """
+    if mantenida_por_triggers(session.bind.dialect.name):
+        return
+    # Las sentencias de texto no provocan autoflush y los MIN/MAX deben ver los cambios pendientes
+    await session.flush()
+    for sentencia, parametros in sentencias_cambios(cambios):
+        await session.exec(sentencia, params=parametros)
+
+
+async def recalcular_categoria(session: AsyncSession, categoria_id: int) -> None:
+    """
+    Rehace la fila de una categoría desde sus productos, salvo que ya la
+    mantengan los triggers. Lo usan las operaciones que tocan muchos
+    productos a la vez (cascadas), donde un agregado sobre la categoría
+    cuesta lo mismo que la propia cascada. No hace commit.
+    """
+    if mantenida_por_triggers(session.bind.dialect.name):
+        return
+    await session.flush()
+    for sentencia in sentencias_reconstruccion(categoria_id):
+        await session.exec(sentencia)
+
+# ======================
+# 🩺 RECONSTRUCCIÓN Y VERIFICACIÓN
+# ======================
+
+def reconstruir(conexion) -> None:
+    """Recalcula la tabla entera desde los productos (conexión síncrona)."""
+    for sentencia in sentencias_reconstruccion():
+        conexion.execute(sentencia)
+
+
+def _distintos(guardado, esperado) -> bool:
+    if guardado is None or esperado is None:
+        return guardado is not esperado
+    return abs(guardado - esperado) > 1e-6 * max(1.0, abs(esperado))
+
+
+def diferencias(conexion) -> list[str]:
+    """Compara la tabla con los agregados calculados desde cero."""
+    guardadas = {
+        fila.categoria_id: fila
+        for fila in conexion.execute(select(TABLA.c.categoria_id, *(TABLA.c[c] for c in COLUMNAS)))
+    }
+    errores = []
+    for esperada in conexion.execute(consulta_agregados()):
+        guardada = guardadas.pop(esperada.categoria_id, None)
+        if guardada is None:
+            errores.append(f"categoría {esperada.categoria_id}: sin fila de estadísticas")
+            continue
+        for columna in COLUMNAS:
+            if _distintos(getattr(guardada, columna), getattr(esperada, columna)):
+                errores.append(
+                    f"categoría {esperada.categoria_id}: {columna} = {getattr(guardada, columna)}, "
+                    f"esperado {getattr(esperada, columna)}"
+                )
+    errores.extend(f"categoría {categoria_id}: fila huérfana" for categoria_id in guardadas)
+    return errores
+
+# ======================
+# 🖥️ LÍNEA DE COMANDOS
+# ======================
+
+def main():
+    import argparse
+    from db import engine
+
+    parser = argparse.ArgumentParser(description="Reconstruye o verifica las estadísticas precalculadas por categoría.")
+    parser.add_argument("--verificar", action="store_true", help="solo compara, sin modificar la tabla")
+    args = parser.parse_args()
+
+    if args.verificar:
+        with engine.connect() as conexion:
+            errores = diferencias(conexion)
+        for error in errores:
+            print(f"❌ {error}")
+        if errores:
+            raise SystemExit(1)
+        print("✅ Estadísticas consistentes con los productos")
+        return
+    with engine.begin() as conexion:
+        reconstruir(conexion)
+        categorias = conexion.execute(select(func.count()).select_from(TABLA)).scalar()
+    print(f"✅ Estadísticas reconstruidas para {categorias} categorías")
+
+
+if __name__ == "__main__":
+    main()
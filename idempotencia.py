@@ -0,0 +1,223 @@
+"""
+Soporte de la cabecera `Idempotency-Key` para las compras y altas de productos.
+
+Los clientes móviles reintentan al agotar su timeout y cada reintento volvía a
+ejecutar la transacción completa (y podía descontar el stock dos veces).
+Con una clave:
+  - la respuesta se guarda en la tabla `idempotencia` en la MISMA transacción
+    que la escritura, así que o quedan las dos o ninguna;
+  - un reintento recibe la respuesta guardada (cabecera `Idempotent-Replayed`)
+    sin tocar `producto`; un caché en memoria evita incluso la lectura;
+  - los duplicados que llegan mientras la original sigue en curso en el mismo
+    worker esperan su resultado en lugar de ejecutarse otra vez;
+  - si otro worker guarda la misma clave primero, la clave primaria rechaza la
+    segunda inserción, se deshace su transacción y se devuelve la guardada.
+
+Reutilizar una clave con otra operación o cuerpo distinto responde 422.
+Las respuestas de error no se guardan: el reintento vuelve a ejecutarse.
+Las filas caducan a los IDEMPOTENCIA_TTL_SEGUNDOS y cada worker las purga
+periódicamente.
+"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+import orjson
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import DateTime, LargeBinary, bindparam, delete, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+import cache
+import config
+from models import RespuestaIdempotente
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 🔑 CLAVES Y RESPUESTAS GUARDADAS
+# ======================
+
+class Guardada(NamedTuple):
+    huella: str
+    codigo: int
+    cuerpo: bytes
+
+
+class ClaveOcupada(Exception):
+    """La operación no se aplicó porque otro worker ya guardó la misma clave."""
+
+
+class Registro:
+    """Clave de la petición en curso; `registrar` le añade la respuesta antes del commit."""
+    __slots__ = ("clave", "huella", "codigo", "guardada")
+
+    def __init__(self, clave: str, huella: str, codigo: int):
+        self.clave = clave
+        self.huella = huella
+        self.codigo = codigo
+        self.guardada: Optional[Guardada] = None
+
+
+def huella(*partes: Any) -> str:
+    """Resumen de la operación y sus datos: la misma clave con otra huella es un error del cliente."""
+    return hashlib.blake2b(repr(partes).encode(), digest_size=16).hexdigest()
+
+
+async def registrar(session: AsyncSession, registro: Optional[Registro], respuesta: Any) -> None:
+    """
+    Guarda la respuesta en la transacción de la operación, antes de su commit.
+    Sin clave no hace nada. Si otro worker ya guardó la clave lanza IntegrityError.
+    """
+    if registro is None:
+        return
+    guardada = _serializar(registro, respuesta)
+    await session.exec(insert(RespuestaIdempotente).values(
+        clave=registro.clave, huella=guardada.huella, codigo=guardada.codigo,
+        cuerpo=guardada.cuerpo, creada=datetime.utcnow(),
+    ))
+    registro.guardada = guardada
+
+
+# SQL fijo: el insert ON CONFLICT del dialecto no entra en la caché de compilación
+_INSERTAR_SI_LIBRE = text(
+    "INSERT INTO idempotencia (clave, huella, codigo, cuerpo, creada) "
+    "VALUES (:clave, :huella, :codigo, :cuerpo, :creada) "
+    "ON CONFLICT (clave) DO NOTHING RETURNING clave"
+).bindparams(bindparam("cuerpo", type_=LargeBinary), bindparam("creada", type_=DateTime))
+
+
+async def registrar_si_libre(session: AsyncSession, registro: Registro, respuesta: Any) -> bool:
+    """
+    Como `registrar`, pero sin error si la clave ya está guardada: devuelve False
+    y quien llama deshace lo suyo. Para transacciones con varias operaciones,
+    donde una clave repetida no debe abortar las demás.
+    """
+    guardada = _serializar(registro, respuesta)
+    fila = (await session.exec(_INSERTAR_SI_LIBRE, params={
+        "clave": registro.clave, "huella": guardada.huella, "codigo": guardada.codigo,
+        "cuerpo": guardada.cuerpo, "creada": datetime.utcnow(),
+    })).first()
+    if fila is None:
+        return False
+    registro.guardada = guardada
+    return True
+
+
+def _serializar(registro: Registro, respuesta: Any) -> Guardada:
+    return Guardada(registro.huella, registro.codigo, orjson.dumps(jsonable_encoder(respuesta)))
+
+
+async def _buscar(session: AsyncSession, clave: str) -> Optional[Guardada]:
+    guardada = cache.respuestas_idempotentes.obtener(clave)
+    if guardada is not cache.FALTA:
+        return guardada
+    fila = (await session.exec(
+        select(RespuestaIdempotente.huella, RespuestaIdempotente.codigo, RespuestaIdempotente.cuerpo)
+        .where(RespuestaIdempotente.clave == clave)
+    )).first()
+    if fila is None:
+        return None
+    guardada = Guardada(*fila)
+    cache.respuestas_idempotentes.guardar(clave, guardada)
+    return guardada
+
+
+def _repetir(guardada: Guardada, huella_peticion: str) -> Response:
+    if guardada.huella != huella_peticion:
+        raise HTTPException(status_code=422, detail="La Idempotency-Key ya se usó con otra operación o cuerpo")
+    return Response(
+        content=guardada.cuerpo, status_code=guardada.codigo,
+        media_type="application/json", headers={"Idempotent-Replayed": "true"},
+    )
+
+# ======================
+# 🔁 EJECUCIÓN IDEMPOTENTE
+# ======================
+
+# Peticiones con clave que se están ejecutando en este worker
+_en_curso: dict[str, asyncio.Future] = {}
+
+
+async def ejecutar(
+    session: AsyncSession,
+    clave: Optional[str],
+    huella_peticion: str,
+    operacion: Callable[[Optional[Registro]], Awaitable[Any]],
+    codigo: int = 200,
+) -> Any:
+    """
+    Ejecuta `operacion(registro)` una sola vez por clave. La operación debe llamar
+    a `registrar(session, registro, respuesta)` antes de su commit.
+    Sin clave es una llamada directa.
+    """
+    if clave is None:
+        return await operacion(None)
+
+    en_curso = _en_curso.get(clave)
+    if en_curso is not None:
+        try:
+            return _repetir(await asyncio.shield(en_curso), huella_peticion)
+        except asyncio.CancelledError:
+            if not en_curso.cancelled():
+                raise
+            # La original se canceló sin terminar: esta petición la sustituye
+            return await ejecutar(session, clave, huella_peticion, operacion, codigo)
+
+    futuro = asyncio.get_running_loop().create_future()
+    _en_curso[clave] = futuro
+    try:
+        guardada = await _buscar(session, clave)
+        if guardada is not None:
+            futuro.set_result(guardada)
+            return _repetir(guardada, huella_peticion)
+        registro = Registro(clave, huella_peticion, codigo)
+        try:
+            resultado = await operacion(registro)
+        except (IntegrityError, ClaveOcupada):
+            # Otro worker guardó la misma clave mientras tanto: su transacción ganó
+            await session.rollback()
+            guardada = await _buscar(session, clave)
+            if guardada is None:
+                raise
+            futuro.set_result(guardada)
+            return _repetir(guardada, huella_peticion)
+        if registro.guardada is not None:
+            cache.respuestas_idempotentes.guardar(clave, registro.guardada)
+            futuro.set_result(registro.guardada)
+        return resultado
+    except Exception as exc:
+        if not futuro.done():
+            futuro.set_exception(exc)
+            # Los duplicados en espera reciben el mismo error; si no hay ninguno no se avisa
+            futuro.exception()
+        raise
+    finally:
+        if not futuro.done():
+            futuro.cancel()
+        del _en_curso[clave]
+
+# ======================
+# 🧹 CADUCIDAD
+# ======================
+
+async def purgar(session: AsyncSession) -> int:
+    """Borra las respuestas guardadas hace más de IDEMPOTENCIA_TTL_SEGUNDOS."""
+    limite = datetime.utcnow() - timedelta(seconds=config.IDEMPOTENCIA_TTL_SEGUNDOS)
+    resultado = await session.exec(delete(RespuestaIdempotente).where(RespuestaIdempotente.creada < limite))
+    await session.commit()
+    return resultado.rowcount
+
+
+async def purgar_periodicamente(fabrica_sesiones) -> None:
+    """Tarea de fondo de cada worker; borrar filas caducadas es idempotente entre workers."""
+    while True:
+        await asyncio.sleep(config.IDEMPOTENCIA_PURGA_SEGUNDOS)
+        try:
+            async with fabrica_sesiones() as session:
+                await purgar(session)
+        except Exception:
+            logger.exception("No se pudieron purgar las respuestas idempotentes caducadas")
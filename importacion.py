@@ -0,0 +1,232 @@
+"""
+Importación y exportación masiva de productos (CSV / NDJSON) para la Tienda Online.
+
+La importación valida cada fila con `ProductoCreate`, resuelve las categorías
+con una sola consulta por lote e inserta cada lote con un INSERT tipo
+executemany. Las filas inválidas no detienen la carga: se reportan al final.
+
+Uso por consola:
+    python importacion.py productos.csv --formato csv --tamano-lote 1000
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import busqueda
+import cache
+import condicionales
+import estadisticas
+from models import Categoria, Producto
+from schemas import ErrorImportacion, ProductoCreate, ProductoRead, ResultadoImportacion
+
+TAMANO_LOTE_IMPORTACION = 1000
+CAMPOS_EXPORTACION = list(ProductoRead.model_fields)
+
+# ======================
+# 📥 LECTURA DE FILAS
+# ======================
+
+async def _registros_csv(lineas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Agrupa líneas en registros CSV completos: una descripción entre comillas
+    puede contener saltos de línea, así que se sigue leyendo mientras haya
+    comillas sin cerrar.
+    """
+    pendiente = ""
+    async for linea in lineas:
+        pendiente += linea
+        if pendiente.count('"') % 2 == 0:
+            yield pendiente
+            pendiente = ""
+    if pendiente:
+        yield pendiente
+
+
+async def leer_filas(lineas: AsyncIterator[str], formato: str) -> AsyncIterator[tuple[int, object]]:
+    """
+    Convierte un flujo de líneas en (número de fila, datos) sin cargar el archivo completo.
+    Si la fila no se puede interpretar, `datos` es el mensaje de error.
+    """
+    if formato == "ndjson":
+        numero = 0
+        async for linea in lineas:
+            if not linea.strip():
+                continue
+            numero += 1
+            try:
+                yield numero, json.loads(linea)
+            except ValueError as exc:
+                yield numero, f"JSON inválido: {exc}"
+        return
+
+    encabezado: Optional[list[str]] = None
+    numero = 0
+    async for registro in _registros_csv(lineas):
+        if not registro.strip():
+            continue
+        valores = next(csv.reader(io.StringIO(registro)))
+        if encabezado is None:
+            encabezado = [campo.strip() for campo in valores]
+            continue
+        numero += 1
+        if len(valores) != len(encabezado):
+            yield numero, f"Se esperaban {len(encabezado)} columnas y llegaron {len(valores)}"
+            continue
+        # En CSV una celda vacía equivale a un campo ausente
+        yield numero, {campo: valor for campo, valor in zip(encabezado, valores) if valor != ""}
+
+
+async def lineas_de_bytes(fragmentos: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Parte un cuerpo HTTP recibido por fragmentos en líneas de texto."""
+    # Decodificador incremental: un carácter UTF-8 puede quedar partido entre fragmentos
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    pendiente = ""
+    async for fragmento in fragmentos:
+        pendiente += decodificador.decode(fragmento)
+        *completas, pendiente = pendiente.split("\n")
+        for linea in completas:
+            yield linea + "\n"
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente:
+        yield pendiente
+
+
+async def lineas_de_archivo(lineas: Iterable[str]) -> AsyncIterator[str]:
+    for linea in lineas:
+        yield linea
+
+# ======================
+# 📦 IMPORTACIÓN POR LOTES
+# ======================
+
+async def _insertar_lote(session: AsyncSession, lote: list[tuple[int, object]], errores: list) -> int:
+    validos: list[tuple[int, ProductoCreate]] = []
+    for numero, datos in lote:
+        if isinstance(datos, str):
+            errores.append(ErrorImportacion(fila=numero, errores=[datos]))
+            continue
+        try:
+            validos.append((numero, ProductoCreate.model_validate(datos)))
+        except ValidationError as exc:
+            mensajes = [f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()]
+            errores.append(ErrorImportacion(fila=numero, errores=mensajes))
+
+    # Una sola consulta por lote para todas las categorías referenciadas
+    ids = {producto.categoria_id for _, producto in validos}
+    activas = set((await session.exec(
+        select(Categoria.id).where(Categoria.id.in_(ids), Categoria.activa == True)
+    )).all()) if ids else set()
+
+    ahora = datetime.utcnow()
+    filas = []
+    for numero, producto in validos:
+        if producto.categoria_id not in activas:
+            errores.append(ErrorImportacion(fila=numero, errores=["Categoría no encontrada o inactiva"]))
+            continue
+        filas.append({
+            **producto.model_dump(),
+            "destacado": False,
+            "fecha_creacion": ahora,
+            "ultima_actualizacion": ahora,
+        })
+    if filas:
+        sentencia = insert(Producto)
+        if busqueda.MODO == "memoria":
+            # El índice en memoria necesita los ids nuevos; con FTS5 los triggers
+            # ya indexan las filas y el executemany plano es mucho más rápido.
+            # Sin sort_by_parameter_order: en SQLite obligaría a un INSERT por fila
+            sentencia = sentencia.returning(Producto.id, Producto.nombre, Producto.descripcion, Producto.activo)
+        resultado = await session.exec(sentencia, params=filas)
+        nuevos = resultado.all() if busqueda.MODO == "memoria" else []
+        await estadisticas.aplicar_cambios(session, [
+            (None, estadisticas.EstadoProducto(fila["categoria_id"], fila["activo"], fila["precio"], fila["stock"]))
+            for fila in filas
+        ])
+        await condicionales.avanzar_version(session)
+        await session.commit()
+        cache.listados_productos.limpiar()
+        cache.categorias_por_id.invalidar(*{fila["categoria_id"] for fila in filas})
+        for producto_id, nombre, descripcion, activo in nuevos:
+            busqueda.producto_guardado(producto_id, nombre, descripcion, activo)
+    return len(filas)
+
+
+async def importar_productos(
+    session: AsyncSession,
+    lineas: AsyncIterator[str],
+    formato: str = "csv",
+    tamano_lote: int = TAMANO_LOTE_IMPORTACION,
+) -> ResultadoImportacion:
+    """
+    Importa productos desde un flujo de líneas CSV o NDJSON.
+    Cada lote se confirma por separado, así que una carga enorme no mantiene
+    abierta una única transacción; las filas con error se devuelven en el reporte.
+    """
+    importados = 0
+    errores: list[ErrorImportacion] = []
+    lote: list[tuple[int, object]] = []
+    async for fila in leer_filas(lineas, formato):
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            importados += await _insertar_lote(session, lote, errores)
+            lote = []
+    if lote:
+        importados += await _insertar_lote(session, lote, errores)
+    return ResultadoImportacion(importados=importados, errores=errores)
+
+# ======================
+# 📤 EXPORTACIÓN EN STREAMING
+# ======================
+
+def formatear_lote(productos, formato: str) -> str:
+    """Serializa un lote de productos (objetos o filas con sus columnas) como líneas NDJSON o filas CSV."""
+    if formato == "ndjson":
+        return "".join(ProductoRead.model_validate(p).model_dump_json() + "\n" for p in productos)
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=CAMPOS_EXPORTACION)
+    for producto in productos:
+        escritor.writerow(ProductoRead.model_validate(producto).model_dump())
+    return salida.getvalue()
+
+
+def encabezado_csv() -> str:
+    return ",".join(CAMPOS_EXPORTACION) + "\r\n"
+
+# ======================
+# 🖥️ LÍNEA DE COMANDOS
+# ======================
+
+async def _importar_archivo(ruta: str, formato: str, tamano_lote: int) -> ResultadoImportacion:
+    from db import AsyncSessionLocal
+
+    with open(ruta, encoding="utf-8", newline="") as archivo:
+        async with AsyncSessionLocal() as session:
+            return await importar_productos(session, lineas_de_archivo(archivo), formato, tamano_lote)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Importa productos en bloque desde CSV o NDJSON.")
+    parser.add_argument("archivo")
+    parser.add_argument("--formato", choices=["csv", "ndjson"], default=None, help="por defecto, según la extensión")
+    parser.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_IMPORTACION)
+    args = parser.parse_args()
+
+    formato = args.formato or ("ndjson" if args.archivo.endswith((".ndjson", ".jsonl")) else "csv")
+    resultado = asyncio.run(_importar_archivo(args.archivo, formato, args.tamano_lote))
+    for error in resultado.errores:
+        print(f"Fila {error.fila}: {'; '.join(error.errores)}")
+    print(f"✅ {resultado.importados} productos importados, {len(resultado.errores)} filas con error")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Operaciones de inventario para la Tienda Online.
+Centraliza el descuento de stock para que se haga en una sola sentencia atómica.
+"""
+
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Producto
+
+# ======================
+# 📦 DESCUENTO ATÓMICO DE STOCK
+# ======================
+
+def sentencia_descuento(producto_id: int, cantidad: int):
+    """
+    UPDATE condicional que resta `cantidad` al stock y devuelve la fila.
+    Solo modifica la fila si el producto está activo y tiene stock suficiente,
+    por lo que dos compras simultáneas nunca pueden sobrevender.
+    Sirve tanto para sesiones síncronas como asíncronas.
+    """
+    return (
+        update(Producto)
+        .where(
+            Producto.id == producto_id,
+            Producto.activo == True,
+            Producto.stock >= cantidad,
+        )
+        .values(
+            stock=Producto.stock - cantidad,
+            ultima_actualizacion=datetime.utcnow(),
+        )
+        .returning(Producto)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
+def sentencia_reposicion(producto_id: int, cantidad: int):
+    """Devuelve `cantidad` al stock: deshace un descuento dentro de la misma transacción."""
+    return (
+        update(Producto)
+        .where(Producto.id == producto_id)
+        .values(stock=Producto.stock + cantidad)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def descontar_stock(session: AsyncSession, producto_id: int, cantidad: int) -> Optional[Producto]:
+    """
+    Resta `cantidad` al stock del producto con un único UPDATE condicional.
+    Devuelve el producto actualizado o None si la fila no cambió.
+    No hace commit: la transacción la controla quien llama.
+    """
+    resultado = await session.exec(sentencia_descuento(producto_id, cantidad))
+    return resultado.scalar_one_or_none()
+
+
+async def motivo_compra_rechazada(session: AsyncSession, producto_id: int) -> tuple[int, str]:
+    """
+    Explica por qué `descontar_stock` no modificó la fila.
+    Solo se consulta en el camino de error, fuera del camino rápido de compra.
+    """
+    producto = await session.get(Producto, producto_id)
+    if not producto:
+        return 404, "Producto no encontrado"
+    if not producto.activo:
+        return 400, "No se puede comprar un producto inactivo"
+    return 400, "Stock insuficiente para la compra"
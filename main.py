@@ -1,6 +1,13 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from sqlmodel import SQLModel
-from db import engine
+from fastapi.responses import PlainTextResponse
+import busqueda
+import cola_compras
+import config
+import idempotencia
+import migraciones
+from db import AsyncSessionLocal, async_engine, async_engines_lectura, engine
 from routers import categorias, productos
 
 # ==========================================================
@@ -11,10 +18,44 @@ from routers import categorias, productos
 # Documentación Swagger: http://127.0.0.1:8000/docs
 # ==========================================================
 
+
+# ==========================================================
+# 🧩 ARRANQUE Y APAGADO
+# ==========================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Cada worker solo comprueba la versión del esquema, sin DDL: las migraciones
+    se aplican antes con `python migraciones.py` (o aquí con DB_MIGRAR_AL_ARRANCAR).
+    Mientras vive, el worker purga las respuestas idempotentes caducadas, construye
+    en segundo plano y refresca el índice de búsqueda en memoria (si no hay FTS5)
+    y, con COMPRAS_AGRUPADAS, mantiene la tarea que confirma las compras por lotes.
+    """
+    if config.DB_MIGRAR_AL_ARRANCAR:
+        migraciones.aplicar_migraciones(engine)
+    else:
+        migraciones.verificar_esquema(engine)
+    busqueda.inicializar_busqueda(engine)
+    tareas = [asyncio.create_task(idempotencia.purgar_periodicamente(AsyncSessionLocal))]
+    if busqueda.MODO == "memoria":
+        tareas.append(asyncio.create_task(busqueda.refrescar_periodicamente(AsyncSessionLocal)))
+    if config.COMPRAS_AGRUPADAS:
+        cola_compras.iniciar()
+    yield
+    await cola_compras.detener()
+    for tarea in tareas:
+        tarea.cancel()
+    for motor in async_engines_lectura:
+        await motor.dispose()
+    await async_engine.dispose()
+    engine.dispose()
+
+
 app = FastAPI(
     title="API Tienda Online",
     description="Sistema de gestión de productos y categorías con SQLModel y FastAPI.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 from fastapi.exceptions import RequestValidationError
@@ -31,11 +72,12 @@ app.add_exception_handler(Exception, conflict_exception_handler)
 
 
 # ==========================================================
-# 🧩 CREACIÓN DE TABLAS AL INICIAR
+# 📈 MÉTRICAS DE RENDIMIENTO
 # ==========================================================
-@app.on_event("startup")
-def on_startup():
-    SQLModel.metadata.create_all(engine)
+import metricas
+
+if config.METRICAS_HABILITADAS:
+    app.add_middleware(metricas.MiddlewareMetricas)
 
 
 # ==========================================================
@@ -54,3 +96,60 @@ def root():
     Endpoint raíz de verificación.
     """
     return {"message": "🛒 API de Tienda Online funcionando correctamente"}
+
+
+# ==========================================================
+# 🧠 ESTADÍSTICAS DEL CACHÉ
+# ==========================================================
+import cache
+
+
+@app.get("/cache/estadisticas", tags=["Monitoreo"])
+def estadisticas_cache():
+    """
+    Aciertos, fallos y ocupación de cada caché en memoria,
+    útiles para ajustar su tamaño y TTL.
+    """
+    return cache.estadisticas()
+
+
+def _estadisticas_cache_por_campo(campo: str) -> dict:
+    return {(nombre,): datos[campo] for nombre, datos in cache.estadisticas().items()}
+
+
+metricas.registrar_medidor(
+    "tienda_cache_hits_total", "Aciertos acumulados de cada caché",
+    lambda: _estadisticas_cache_por_campo("aciertos"), ("cache",), tipo="counter",
+)
+metricas.registrar_medidor(
+    "tienda_cache_misses_total", "Fallos acumulados de cada caché",
+    lambda: _estadisticas_cache_por_campo("fallos"), ("cache",), tipo="counter",
+)
+metricas.registrar_medidor(
+    "tienda_cache_entries", "Entradas ocupadas en cada caché", lambda: _estadisticas_cache_por_campo("entradas"), ("cache",),
+)
+metricas.registrar_medidor(
+    "tienda_cola_compras_pendientes", "Compras encoladas a la espera del siguiente lote",
+    lambda: {(): cola_compras.pendientes()},
+)
+metricas.registrar_medidor(
+    "tienda_db_pool_checked_out", "Conexiones del pool asíncrono en uso",
+    lambda: {(): async_engine.pool.checkedout()} if hasattr(async_engine.pool, "checkedout") else {},
+)
+metricas.registrar_medidor(
+    "tienda_db_pool_lectura_checked_out", "Conexiones en uso de cada pool de lectura (réplica o primaria de solo lectura)",
+    lambda: {
+        (str(indice),): motor.pool.checkedout()
+        for indice, motor in enumerate(async_engines_lectura) if hasattr(motor.pool, "checkedout")
+    },
+    ("motor",),
+)
+
+
+@app.get("/metrics", tags=["Monitoreo"], response_class=PlainTextResponse)
+def exportar_metricas():
+    """
+    Métricas en formato de texto de Prometheus: latencia por ruta, sentencias SQL
+    y tiempo de base de datos por petición, excesos del presupuesto de consultas y cachés.
+    """
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
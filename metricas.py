@@ -0,0 +1,218 @@
+"""
+Métricas de rendimiento de la Tienda Online en formato de texto de Prometheus.
+
+Un middleware ASGI mide la latencia de cada petición por ruta. Los eventos
+del motor (ver db.py) cuentan las sentencias SQL y su duración, tanto en
+total como por petición: si una petición supera el presupuesto de consultas
+se registra como posible N+1. Todo se expone en GET /metrics.
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Optional
+import config
+
+logger = logging.getLogger("tienda.metricas")
+
+# ======================
+# 📊 TIPOS DE MÉTRICA
+# ======================
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def incrementar(self, *valores, cantidad: float = 1) -> None:
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exportar(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for valores, total in self._valores.items():
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, limites: tuple, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self.etiquetas = etiquetas
+        # Por combinación de etiquetas: [conteo por cubeta (+Inf al final), suma]
+        self._series: dict[tuple, list] = {}
+        self._lock = Lock()
+
+    def observar(self, valor: float, *valores) -> None:
+        cubeta = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+
+    def exportar(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(valores, list(conteos), suma) for valores, (conteos, suma) in self._series.items()]
+        for valores, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                etiquetas = _etiquetas(self.etiquetas, valores, f'le="{le}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """
+    Valor que se lee de otro módulo al exportar (ocupación del pool, del caché...).
+    `tipo="counter"` para valores acumulados como los aciertos del caché.
+    """
+
+    def __init__(self, nombre: str, ayuda: str, leer: Callable[[], dict], etiquetas: tuple = (), tipo: str = "gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.leer = leer
+        self.etiquetas = etiquetas
+        self.tipo = tipo
+
+    def exportar(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for valores, valor in self.leer().items():
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {valor}")
+        return lineas
+
+# ======================
+# 🗂️ MÉTRICAS DE LA TIENDA
+# ======================
+
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+peticiones = Contador(
+    "tienda_http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"),
+)
+latencia = Histograma(
+    "tienda_http_request_duration_seconds", "Latencia de las peticiones HTTP", LIMITES_SEGUNDOS, ("method", "route"),
+)
+consultas_por_peticion = Histograma(
+    "tienda_db_queries_per_request", "Sentencias SQL ejecutadas por petición", LIMITES_CONSULTAS, ("method", "route"),
+)
+tiempo_db_por_peticion = Histograma(
+    "tienda_db_time_per_request_seconds", "Tiempo total en la base de datos por petición", LIMITES_SEGUNDOS, ("method", "route"),
+)
+duracion_consultas = Histograma(
+    "tienda_db_query_duration_seconds", "Duración de cada sentencia SQL", LIMITES_SEGUNDOS,
+)
+excesos_consultas = Contador(
+    "tienda_db_query_budget_exceeded_total", "Peticiones que superaron el presupuesto de consultas (posible N+1)",
+    ("method", "route"),
+)
+
+METRICAS: list = [peticiones, latencia, consultas_por_peticion, tiempo_db_por_peticion, duracion_consultas, excesos_consultas]
+
+
+def registrar_medidor(nombre: str, ayuda: str, leer: Callable[[], dict], etiquetas: tuple = (), tipo: str = "gauge") -> None:
+    METRICAS.append(Medidor(nombre, ayuda, leer, etiquetas, tipo))
+
+
+def exportar() -> str:
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    lineas: list[str] = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.exportar())
+    return "\n".join(lineas) + "\n"
+
+# ======================
+# 🧮 CONTEO POR PETICIÓN
+# ======================
+
+class EstadoPeticion:
+    __slots__ = ("consultas", "tiempo_db")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+
+
+# Estado de la petición en curso; también lo ven los hilos del threadpool
+_peticion: ContextVar[Optional[EstadoPeticion]] = ContextVar("peticion_metricas", default=None)
+
+
+def registrar_consulta(duracion: float) -> None:
+    """Lo llaman los eventos del motor tras cada sentencia SQL."""
+    duracion_consultas.observar(duracion)
+    estado = _peticion.get()
+    if estado is not None:
+        estado.consultas += 1
+        estado.tiempo_db += duracion
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware, para no crear una tarea
+    extra por petición). La ruta se etiqueta con su plantilla, p. ej.
+    /productos/{producto_id}, para no multiplicar las series.
+    """
+
+    def __init__(self, app, presupuesto_consultas: int = config.METRICAS_PRESUPUESTO_CONSULTAS):
+        self.app = app
+        self.presupuesto_consultas = presupuesto_consultas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = EstadoPeticion()
+        token = _peticion.set(estado)
+        codigo = 500
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _peticion.reset(token)
+            metodo = scope["method"]
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            peticiones.incrementar(metodo, ruta, codigo)
+            latencia.observar(duracion, metodo, ruta)
+            consultas_por_peticion.observar(estado.consultas, metodo, ruta)
+            tiempo_db_por_peticion.observar(estado.tiempo_db, metodo, ruta)
+            if estado.consultas > self.presupuesto_consultas:
+                excesos_consultas.incrementar(metodo, ruta)
+                logger.warning(
+                    "Posible N+1 en %s %s: %d sentencias SQL (presupuesto %d)",
+                    metodo, ruta, estado.consultas, self.presupuesto_consultas,
+                )
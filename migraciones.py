@@ -0,0 +1,206 @@
+"""
+Migraciones versionadas del esquema de la Tienda Online.
+
+Se aplican fuera de banda, una vez por despliegue y antes de arrancar los workers:
+    python migraciones.py
+
+Cada migración tiene un número de versión y se registra en la tabla
+`version_esquema`. Los workers solo comprueban al arrancar que la base está
+en `VERSION_ESQUEMA` (una consulta, sin DDL). Las migraciones son
+idempotentes: una base creada antes de existir este módulo se pone al día
+sin perder datos.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text, update
+from sqlmodel import SQLModel
+import busqueda
+import condicionales
+import estadisticas
+from models import Categoria, CategoriaEstadisticas, Producto, RespuestaIdempotente
+
+# ======================
+# 🏷️ VERSIÓN DEL ESQUEMA
+# ======================
+
+_metadata_control = MetaData()
+
+version_esquema = Table(
+    "version_esquema",
+    _metadata_control,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String, nullable=False),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+# ======================
+# 🧱 MIGRACIONES
+# ======================
+
+def _tablas_iniciales(conexion) -> None:
+    # Solo las tablas originales: las posteriores las crean sus propias migraciones
+    SQLModel.metadata.create_all(conexion, tables=[Categoria.__table__, Producto.__table__])
+
+
+def _indices(conexion) -> None:
+    # create_all no añade índices nuevos a tablas que ya existían; los índices
+    # sobre columnas que aún no existen los crea la migración que añade la columna
+    for tabla in (Categoria.__table__, Producto.__table__):
+        existentes = {columna["name"] for columna in inspect(conexion).get_columns(tabla.name)}
+        for indice in tabla.indexes:
+            if {columna.name for columna in indice.columns} <= existentes:
+                indice.create(conexion, checkfirst=True)
+
+
+def _busqueda_texto(conexion) -> None:
+    if conexion.dialect.name == "sqlite" and busqueda.fts5_disponible(conexion):
+        busqueda.crear_fts5(conexion)
+
+
+def _estadisticas_categoria(conexion) -> None:
+    CategoriaEstadisticas.__table__.create(conexion, checkfirst=True)
+    if estadisticas.mantenida_por_triggers(conexion.dialect.name):
+        estadisticas.crear_triggers(conexion)
+    estadisticas.reconstruir(conexion)
+
+
+def _version_categoria(conexion) -> None:
+    columnas = {columna["name"] for columna in inspect(conexion).get_columns("categoria")}
+    if "ultima_actualizacion" not in columnas:
+        conexion.execute(text(
+            "ALTER TABLE categoria ADD COLUMN ultima_actualizacion DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'"
+        ))
+        conexion.execute(update(Categoria).values(ultima_actualizacion=Categoria.fecha_creacion))
+    for tabla in (Categoria.__table__, Producto.__table__):
+        for indice in tabla.indexes:
+            indice.create(conexion, checkfirst=True)
+
+
+def _idempotencia(conexion) -> None:
+    RespuestaIdempotente.__table__.create(conexion, checkfirst=True)
+
+
+# Índices encabezados por activo de la versión 2, sustituidos en la 7
+_INDICES_POR_ACTIVO = ("ix_producto_activo_categoria_precio", "ix_producto_activo_precio", "ix_producto_activo_stock")
+
+
+def _indices_sin_activo(conexion) -> None:
+    for nombre in _INDICES_POR_ACTIVO:
+        conexion.execute(text(f"DROP INDEX IF EXISTS {nombre}"))
+    for indice in Producto.__table__.indexes:
+        indice.create(conexion, checkfirst=True)
+
+
+def _version_catalogo(conexion) -> None:
+    condicionales.crear_version(conexion)
+
+
+MIGRACIONES: list[tuple[int, str, Callable]] = [
+    (1, "Tablas categoria y producto", _tablas_iniciales),
+    (2, "Índices de producto para filtros y listados", _indices),
+    (3, "Tabla FTS5 y triggers de búsqueda de productos", _busqueda_texto),
+    (4, "Tabla categoria_stats y triggers de agregados por categoría", _estadisticas_categoria),
+    (5, "Fecha de actualización de categoría e índices de versión del catálogo para ETag", _version_categoria),
+    (6, "Tabla idempotencia de respuestas por Idempotency-Key", _idempotencia),
+    (7, "Índices de producto sin activo al frente, para servir el orden de las páginas", _indices_sin_activo),
+    (8, "Tabla catalogo_version y triggers del contador de versión del catálogo para ETag", _version_catalogo),
+    (9, "Contador de versión del catálogo repartido en varias filas", _version_catalogo),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# ======================
+# 🚚 APLICACIÓN Y VERIFICACIÓN
+# ======================
+
+@contextmanager
+def _transaccion_exclusiva(engine):
+    """
+    Transacción que toma el bloqueo de escritura desde el principio, para que
+    dos procesos que migren a la vez se esperen en lugar de pisarse.
+    En SQLite se abre a mano con BEGIN IMMEDIATE: el driver por defecto no
+    incluye el DDL en la transacción.
+    """
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as conexion:
+            yield conexion
+        return
+    with engine.connect() as conexion:
+        conexion = conexion.execution_options(isolation_level="AUTOCOMMIT")
+        conexion.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.exec_driver_sql("ROLLBACK")
+            raise
+        conexion.exec_driver_sql("COMMIT")
+
+
+def _version_actual(conexion) -> int:
+    if not inspect(conexion).has_table("version_esquema"):
+        return 0
+    return conexion.execute(select(func.max(version_esquema.c.version))).scalar() or 0
+
+
+def aplicar_migraciones(engine) -> list[int]:
+    """Aplica en una transacción las migraciones pendientes y devuelve sus versiones."""
+    with _transaccion_exclusiva(engine) as conexion:
+        version_esquema.create(conexion, checkfirst=True)
+        actual = _version_actual(conexion)
+        aplicadas = []
+        for version, descripcion, migrar in MIGRACIONES:
+            if version <= actual:
+                continue
+            migrar(conexion)
+            conexion.execute(version_esquema.insert().values(
+                version=version, descripcion=descripcion, aplicada_en=datetime.utcnow(),
+            ))
+            aplicadas.append(version)
+        return aplicadas
+
+
+def verificar_esquema(engine) -> int:
+    """
+    Lo que hace cada worker al arrancar: leer la versión y fallar rápido si
+    faltan migraciones, en vez de ejecutar DDL en cada arranque.
+    """
+    with engine.connect() as conexion:
+        actual = _version_actual(conexion)
+    if actual < VERSION_ESQUEMA:
+        raise RuntimeError(
+            f"La base está en la versión {actual} del esquema y la aplicación necesita la "
+            f"{VERSION_ESQUEMA}: ejecuta `python migraciones.py` antes de arrancar "
+            f"(o DB_MIGRAR_AL_ARRANCAR=true en desarrollo)."
+        )
+    return actual
+
+# ======================
+# 🖥️ LÍNEA DE COMANDOS
+# ======================
+
+def main():
+    import argparse
+    from db import DATABASE_URL, engine
+
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema.")
+    parser.add_argument("--verificar", action="store_true", help="solo comprueba la versión, sin migrar")
+    args = parser.parse_args()
+
+    if args.verificar:
+        try:
+            print(f"✅ Esquema en la versión {verificar_esquema(engine)}")
+        except RuntimeError as exc:
+            raise SystemExit(f"❌ {exc}")
+        return
+    aplicadas = aplicar_migraciones(engine)
+    if aplicadas:
+        for version, descripcion, _ in MIGRACIONES:
+            if version in aplicadas:
+                print(f"⬆️  {version}: {descripcion}")
+    print(f"✅ {DATABASE_URL} en la versión {VERSION_ESQUEMA} del esquema")
+
+
+if __name__ == "__main__":
+    main()
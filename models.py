@@ -5,6 +5,7 @@ Incluye mejoras de campos automáticos y productos destacados.
 
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import BigInteger, Column, Index, LargeBinary
 from sqlmodel import SQLModel, Field, Relationship
 
 # ======================
@@ -21,6 +22,7 @@ class Categoria(SQLModel, table=True):
     descripcion: Optional[str] = None
     activa: bool = Field(default=True)
     fecha_creacion: datetime = Field(default_factory=datetime.utcnow)
+    ultima_actualizacion: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     # Relación 1:N con Producto
     productos: List["Producto"] = Relationship(back_populates="categoria")
@@ -35,6 +37,18 @@ class Producto(SQLModel, table=True):
     Representa un producto dentro de la tienda.
     Cada producto pertenece a una categoría.
     """
+    # Índices para los filtros y órdenes de listar_productos. `activo` no encabeza
+    # ninguno: casi todas las filas están activas y una igualdad sobre él hacía que
+    # SQLite ordenara todos los activos en vez de recorrer el rowid. El orden por id
+    # lo sirven el rowid e ix_producto_categoria_id; el orden por precio, estos dos.
+    __table_args__ = (
+        Index("ix_producto_categoria_precio", "categoria_id", "precio"),
+        Index("ix_producto_precio", "precio"),
+        Index("ix_producto_stock", "stock"),
+        # Productos modificados, para el refresco del índice de búsqueda en memoria
+        Index("ix_producto_ultima_actualizacion", "ultima_actualizacion"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     nombre: str = Field(nullable=False)
     descripcion: Optional[str] = None
@@ -45,5 +59,60 @@ class Producto(SQLModel, table=True):
     fecha_creacion: datetime = Field(default_factory=datetime.utcnow)
     ultima_actualizacion: datetime = Field(default_factory=datetime.utcnow)
 
-    categoria_id: int = Field(foreign_key="categoria.id")
+    categoria_id: int = Field(foreign_key="categoria.id", index=True)
     categoria: Optional[Categoria] = Relationship(back_populates="productos")
+
+
+# ======================
+# 📊 ESTADÍSTICAS DE CATEGORÍA
+# ======================
+
+class CategoriaEstadisticas(SQLModel, table=True):
+    """
+    Agregados precalculados de los productos activos de una categoría.
+    Se mantienen de forma incremental en cada escritura (ver estadisticas.py).
+    """
+    __tablename__ = "categoria_stats"
+
+    categoria_id: int = Field(foreign_key="categoria.id", primary_key=True)
+    productos_activos: int = Field(default=0)
+    stock_total: int = Field(default=0)
+    valor_inventario: float = Field(default=0.0, description="Suma de precio * stock")
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    actualizado: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ======================
+# 🔢 VERSIÓN DEL CATÁLOGO
+# ======================
+
+class VersionCatalogo(SQLModel, table=True):
+    """
+    Contador repartido en varias filas: cualquier escritura de productos o
+    categorías avanza una en su misma transacción y la versión del catálogo es
+    la suma (ver condicionales.py).
+    """
+    __tablename__ = "catalogo_version"
+
+    id: int = Field(primary_key=True)
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
+    actualizada: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ======================
+# 🔑 RESPUESTAS IDEMPOTENTES
+# ======================
+
+class RespuestaIdempotente(SQLModel, table=True):
+    """
+    Respuesta de una petición con cabecera Idempotency-Key, para devolverla
+    tal cual a los reintentos (ver idempotencia.py).
+    """
+    __tablename__ = "idempotencia"
+
+    clave: str = Field(primary_key=True, max_length=255)
+    huella: str = Field(description="Resumen de la operación y su cuerpo, para detectar claves reutilizadas")
+    codigo: int
+    cuerpo: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    creada: datetime = Field(default_factory=datetime.utcnow, index=True)
@@ -0,0 +1,30 @@
+"""
+Utilidades de paginación por cursor (keyset) para la Tienda Online.
+El cursor es opaco para el cliente: codifica en base64 la clave de la última fila entregada.
+"""
+
+import base64
+import json
+from fastapi import HTTPException
+
+# ======================
+# 🔖 CURSORES OPACOS
+# ======================
+
+def codificar_cursor(*clave) -> str:
+    """Convierte la clave de ordenamiento de la última fila en un cursor opaco."""
+    return base64.urlsafe_b64encode(json.dumps(list(clave)).encode()).decode()
+
+
+def decodificar_cursor(cursor: str, campos: int) -> list:
+    """
+    Recupera la clave de ordenamiento a partir de un cursor.
+    Lanza 400 si el cursor está mal formado o no corresponde al orden pedido.
+    """
+    try:
+        clave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(clave, list) or len(clave) != campos:
+        raise HTTPException(status_code=400, detail="Cursor inválido para este orden")
+    return clave
@@ -3,11 +3,21 @@ Rutas para gestionar las categorías de productos.
 Ahora incluye la opción de reactivar categorías.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from db import get_session
-from models import Categoria
-from schemas import CategoriaCreate, CategoriaRead
+from datetime import datetime
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import case, func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import busqueda
+import cache
+import condicionales
+import estadisticas
+import serializacion
+from db import get_async_session_escritura, get_async_session_lectura, lee_de_primaria
+from paginacion import codificar_cursor, decodificar_cursor
+from models import Categoria, CategoriaEstadisticas, Producto
+from schemas import CategoriaCreate, CategoriaRead, CategoriaCascada, CategoriaEstadisticasRead, CategoriaResumen, ProductoRead
 
 router = APIRouter(prefix="/categorias", tags=["Categorías"])
 
@@ -16,26 +26,69 @@ router = APIRouter(prefix="/categorias", tags=["Categorías"])
 # ======================
 
 @router.post("/", response_model=CategoriaRead, status_code=status.HTTP_201_CREATED)
-def crear_categoria(categoria: CategoriaCreate, session: Session = Depends(get_session)):
-    existente = session.exec(select(Categoria).where(Categoria.nombre == categoria.nombre)).first()
+async def crear_categoria(categoria: CategoriaCreate, session: AsyncSession = Depends(get_async_session_escritura)):
+    existente = (await session.exec(select(Categoria).where(Categoria.nombre == categoria.nombre))).first()
     if existente:
         raise HTTPException(status_code=409, detail="Ya existe una categoría con ese nombre.")
     nueva_categoria = Categoria(nombre=categoria.nombre, descripcion=categoria.descripcion)
     session.add(nueva_categoria)
-    session.commit()
-    session.refresh(nueva_categoria)
+    await session.flush()
+    await estadisticas.recalcular_categoria(session, nueva_categoria.id)
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(nueva_categoria)
+    cache.listado_categorias.limpiar()
     return nueva_categoria
 
 # ======================
 # 🟢 LISTAR CATEGORÍAS ACTIVAS
 # ======================
 
-@router.get("/", response_model=list[CategoriaRead])
-def listar_categorias_activas(session: Session = Depends(get_session)):
-    categorias = session.exec(select(Categoria).where(Categoria.activa == True)).all()
-    if not categorias:
-        raise HTTPException(status_code=404, detail="No hay categorías activas.")
-    return categorias
+def _query_resumen():
+    """
+    Categorías con el conteo de productos y el stock activo, en una sola
+    consulta agregada (LEFT JOIN + GROUP BY) en lugar de una por categoría.
+    """
+    return (
+        select(
+            *serializacion.COLUMNAS_CATEGORIA,
+            func.count(Producto.id).label("productos_totales"),
+            func.coalesce(func.sum(case((Producto.activo == True, 1), else_=0)), 0).label("productos_activos"),
+            func.coalesce(func.sum(case((Producto.activo == True, Producto.stock), else_=0)), 0).label("stock_total"),
+        )
+        .outerjoin(Producto, Producto.categoria_id == Categoria.id)
+        .group_by(Categoria.id)
+    )
+
+
+def _resumen(fila) -> CategoriaResumen:
+    return CategoriaResumen(**fila._mapping)
+
+
+@router.get("/", response_model=Union[List[CategoriaResumen], List[CategoriaRead]])
+async def listar_categorias_activas(
+    request: Request,
+    counts_only: bool = Query(False, description="Incluye conteos de productos y stock por categoría"),
+    session: AsyncSession = Depends(get_async_session_lectura),
+):
+    # Un cliente fijado a la primaria tras escribir no lee el caché (ver db.lee_de_primaria)
+    usar_cache = not counts_only and not lee_de_primaria(request)
+    entrada = cache.listado_categorias.obtener("activas") if usar_cache else cache.FALTA
+    if entrada is cache.FALTA:
+        validadores = await condicionales.version_catalogo(session)
+        if condicionales.no_modificado(request, validadores):
+            return condicionales.respuesta_no_modificado(validadores)
+        query = _query_resumen() if counts_only else select(*serializacion.COLUMNAS_CATEGORIA)
+        filas = (await session.exec(query.where(Categoria.activa == True))).all()
+        if not filas:
+            raise HTTPException(status_code=404, detail="No hay categorías activas.")
+        entrada = (serializacion.filas_a_json(filas), validadores)
+        if not counts_only:
+            cache.listado_categorias.guardar("activas", entrada)
+    cuerpo, validadores = entrada
+    if condicionales.no_modificado(request, validadores):
+        return condicionales.respuesta_no_modificado(validadores)
+    return serializacion.respuesta_json(cuerpo, condicionales.cabeceras(validadores))
 
 # ======================
 # 🟢 OBTENER CATEGORÍA CON SUS PRODUCTOS
@@ -43,19 +96,96 @@ def listar_categorias_activas(session: Session = Depends(get_session)):
 
 from schemas import CategoriaConProductos  # ✅ importa el nuevo esquema
 
-@router.get("/{categoria_id}", response_model=CategoriaConProductos)
-def obtener_categoria_con_productos(categoria_id: int, session: Session = Depends(get_session)):
+LIMITE_PRODUCTOS_EMBEBIDOS = 100
+
+
+@router.get("/{categoria_id}", response_model=Union[CategoriaResumen, CategoriaConProductos])
+async def obtener_categoria_con_productos(
+    categoria_id: int,
+    request: Request,
+    response: Response,
+    solo_activos: bool = Query(True, description="Embebe solo los productos activos"),
+    limite_productos: int = Query(LIMITE_PRODUCTOS_EMBEBIDOS, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    counts_only: bool = Query(False, description="Devuelve solo conteos y stock total, sin productos"),
+    session: AsyncSession = Depends(get_async_session_lectura),
+):
     """
     Retorna una categoría por su ID junto con sus productos relacionados.
-    Incluye la relación 1:N en la respuesta.
+    Los productos se embeben por páginas ordenadas por ID (siguiente página en
+    la cabecera `X-Next-Cursor`) para que la respuesta tenga un tamaño acotado.
+    Con `counts_only` devuelve los conteos de una sola consulta agregada.
+    Lleva ETag de la versión del catálogo (304 con `If-None-Match` coincidente).
     """
-    categoria = session.get(Categoria, categoria_id)
+    # Solo se cachea la vista por defecto, que es la que recibe casi todo el tráfico
+    vista_por_defecto = (
+        not counts_only and solo_activos and limite_productos == LIMITE_PRODUCTOS_EMBEBIDOS and cursor is None
+    )
+    if vista_por_defecto and not lee_de_primaria(request):
+        pagina = cache.categorias_por_id.obtener(categoria_id)
+        if pagina is not cache.FALTA:
+            respuesta, siguiente_cursor, validadores = pagina
+            if condicionales.no_modificado(request, validadores):
+                return condicionales.respuesta_no_modificado(validadores)
+            response.headers.update(condicionales.cabeceras(validadores))
+            if siguiente_cursor is not None:
+                response.headers["X-Next-Cursor"] = siguiente_cursor
+            return respuesta
+
+    validadores = await condicionales.version_catalogo(session)
+    if condicionales.no_modificado(request, validadores):
+        return condicionales.respuesta_no_modificado(validadores)
+    response.headers.update(condicionales.cabeceras(validadores))
+
+    if counts_only:
+        fila = (await session.exec(_query_resumen().where(Categoria.id == categoria_id))).first()
+        if not fila:
+            raise HTTPException(status_code=404, detail="Categoría no encontrada")
+        return _resumen(fila)
+
+    categoria = await session.get(Categoria, categoria_id)
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
 
-    # Carga los productos asociados
-    categoria.productos
-    return categoria
+    # Los productos se traen con una consulta keyset acotada en lugar de la
+    # carga perezosa de la relación completa.
+    query = select(Producto).where(Producto.categoria_id == categoria_id)
+    if solo_activos:
+        query = query.where(Producto.activo == True)
+    if cursor is not None:
+        (ultimo_id,) = decodificar_cursor(cursor, 1)
+        query = query.where(Producto.id > ultimo_id)
+    productos = (await session.exec(query.order_by(Producto.id).limit(limite_productos + 1))).all()
+
+    siguiente_cursor = None
+    if len(productos) > limite_productos:
+        productos = productos[:limite_productos]
+        siguiente_cursor = codificar_cursor(productos[-1].id)
+        response.headers["X-Next-Cursor"] = siguiente_cursor
+    respuesta = CategoriaConProductos(
+        **CategoriaRead.model_validate(categoria).model_dump(),
+        productos=[ProductoRead.model_validate(producto) for producto in productos],
+    )
+    if vista_por_defecto:
+        cache.categorias_por_id.guardar(categoria_id, (respuesta, siguiente_cursor, validadores))
+    return respuesta
+
+
+# ======================
+# 📊 ESTADÍSTICAS DE CATEGORÍA
+# ======================
+
+@router.get("/{categoria_id}/estadisticas", response_model=CategoriaEstadisticasRead)
+async def obtener_estadisticas_categoria(categoria_id: int, session: AsyncSession = Depends(get_async_session_lectura)):
+    """
+    Productos activos, stock total, valor del inventario y rango de precios.
+    Lee la fila precalculada de `categoria_stats`: el coste no depende del
+    número de productos de la categoría.
+    """
+    fila = await session.get(CategoriaEstadisticas, categoria_id)
+    if not fila:
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    return fila
 
 
 # ======================
@@ -63,55 +193,87 @@ def obtener_categoria_con_productos(categoria_id: int, session: Session = Depend
 # ======================
 
 @router.put("/{categoria_id}", response_model=CategoriaRead)
-def actualizar_categoria(categoria_id: int, datos: CategoriaCreate, session: Session = Depends(get_session)):
-    categoria = session.get(Categoria, categoria_id)
+async def actualizar_categoria(categoria_id: int, datos: CategoriaCreate, session: AsyncSession = Depends(get_async_session_escritura)):
+    categoria = await session.get(Categoria, categoria_id)
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     if categoria.nombre != datos.nombre:
-        existente = session.exec(select(Categoria).where(Categoria.nombre == datos.nombre)).first()
+        existente = (await session.exec(select(Categoria).where(Categoria.nombre == datos.nombre))).first()
         if existente:
             raise HTTPException(status_code=409, detail="Ya existe otra categoría con ese nombre.")
     categoria.nombre = datos.nombre
     categoria.descripcion = datos.descripcion
+    categoria.ultima_actualizacion = datetime.utcnow()
     session.add(categoria)
-    session.commit()
-    session.refresh(categoria)
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(categoria)
+    cache.invalidar_categoria(categoria_id)
     return categoria
 
+# ======================
+# 🔁 CASCADA DE ACTIVACIÓN
+# ======================
+
+def _sentencia_cascada(categoria_id: int, activo: bool):
+    """
+    Propaga el estado de la categoría a todos sus productos con un único
+    UPDATE ... WHERE categoria_id = ?, sin cargar los productos en memoria.
+    Solo toca las filas que cambian y devuelve sus IDs.
+    """
+    return (
+        update(Producto)
+        .where(Producto.categoria_id == categoria_id, Producto.activo != activo)
+        .values(activo=activo, ultima_actualizacion=datetime.utcnow())
+        .returning(Producto.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _cascada_activo(session: AsyncSession, categoria_id: int, activo: bool) -> list[int]:
+    """Ejecuta la cascada y devuelve los IDs afectados. No hace commit."""
+    return list((await session.exec(_sentencia_cascada(categoria_id, activo))).scalars())
+
 # ======================
 # 🔴 DESACTIVAR CATEGORÍA
 # ======================
 
-@router.patch("/{categoria_id}/desactivar", response_model=CategoriaRead)
-def desactivar_categoria(categoria_id: int, session: Session = Depends(get_session)):
-    categoria = session.get(Categoria, categoria_id)
+@router.patch("/{categoria_id}/desactivar", response_model=CategoriaCascada)
+async def desactivar_categoria(categoria_id: int, session: AsyncSession = Depends(get_async_session_escritura)):
+    categoria = await session.get(Categoria, categoria_id)
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     categoria.activa = False
-    for producto in categoria.productos:
-        producto.activo = False
-        session.add(producto)
+    categoria.ultima_actualizacion = datetime.utcnow()
     session.add(categoria)
-    session.commit()
-    session.refresh(categoria)
-    return categoria
+    productos_ids = await _cascada_activo(session, categoria_id, False)
+    await estadisticas.recalcular_categoria(session, categoria_id)
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(categoria)
+    cache.invalidar_categoria(categoria_id, tuple(productos_ids), cascada=True)
+    busqueda.productos_activados(productos_ids, False)
+    return CategoriaCascada(**CategoriaRead.model_validate(categoria).model_dump(), productos_afectados=len(productos_ids))
 
 # ======================
 # 🟢 REACTIVAR CATEGORÍA
 # ======================
 
-@router.patch("/{categoria_id}/reactivar", response_model=CategoriaRead)
-def reactivar_categoria(categoria_id: int, session: Session = Depends(get_session)):
-    categoria = session.get(Categoria, categoria_id)
+@router.patch("/{categoria_id}/reactivar", response_model=CategoriaCascada)
+async def reactivar_categoria(categoria_id: int, session: AsyncSession = Depends(get_async_session_escritura)):
+    categoria = await session.get(Categoria, categoria_id)
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     if categoria.activa:
         raise HTTPException(status_code=409, detail="La categoría ya está activa")
     categoria.activa = True
-    for producto in categoria.productos:
-        producto.activo = True
-        session.add(producto)
+    categoria.ultima_actualizacion = datetime.utcnow()
     session.add(categoria)
-    session.commit()
-    session.refresh(categoria)
-    return categoria
+    productos_ids = await _cascada_activo(session, categoria_id, True)
+    await estadisticas.recalcular_categoria(session, categoria_id)
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(categoria)
+    cache.invalidar_categoria(categoria_id, tuple(productos_ids), cascada=True)
+    busqueda.productos_activados(productos_ids, True)
+    return CategoriaCascada(**CategoriaRead.model_validate(categoria).model_dump(), productos_afectados=len(productos_ids))
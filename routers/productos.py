@@ -3,13 +3,28 @@ Rutas para la gestión de productos.
 Mejoradas con mensajes de filtro, reactivación y campos extra.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Optional, List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Literal
 from datetime import datetime
-from sqlmodel import Session, select
-from db import get_session
+from sqlalchemy import tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import busqueda
+import cache
+import cola_compras
+import condicionales
+import estadisticas
+import idempotencia
+import serializacion
+from db import get_async_session_escritura, get_async_session_lectura, lee_de_primaria, sesion_lectura
+from paginacion import codificar_cursor, decodificar_cursor
+from importacion import TAMANO_LOTE_IMPORTACION, encabezado_csv, formatear_lote, importar_productos, lineas_de_bytes
+from inventario import descontar_stock, motivo_compra_rechazada
 from models import Producto, Categoria
-from schemas import ProductoCreate, ProductoRead
+from schemas import ProductoCreate, ProductoRead, CompraLoteRequest, LineaCompraResultado, ResultadoImportacion
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
@@ -18,9 +33,27 @@ router = APIRouter(prefix="/productos", tags=["Productos"])
 # 🟢 CREAR PRODUCTO
 # ======================
 
+# Cabecera opcional de los endpoints que un cliente puede reintentar sin riesgo (ver idempotencia.py)
+IdempotencyKey = Header(
+    None, alias="Idempotency-Key", min_length=1, max_length=255,
+    description="Identificador único de la operación: los reintentos con la misma clave reciben la respuesta original",
+)
+
+
 @router.post("/", response_model=ProductoRead, status_code=status.HTTP_201_CREATED)
-def crear_producto(producto: ProductoCreate, session: Session = Depends(get_session)):
-    categoria = session.get(Categoria, producto.categoria_id)
+async def crear_producto(
+    producto: ProductoCreate,
+    idempotency_key: Optional[str] = IdempotencyKey,
+    session: AsyncSession = Depends(get_async_session_escritura),
+):
+    return await idempotencia.ejecutar(
+        session, idempotency_key, idempotencia.huella("crear_producto", producto.model_dump()),
+        lambda registro: _crear_producto(session, producto, registro), codigo=status.HTTP_201_CREATED,
+    )
+
+
+async def _crear_producto(session: AsyncSession, producto: ProductoCreate, registro: Optional[idempotencia.Registro]):
+    categoria = await session.get(Categoria, producto.categoria_id)
     if not categoria or not categoria.activa:
         raise HTTPException(status_code=404, detail="Categoría no encontrada o inactiva")
     if producto.stock < 0:
@@ -35,37 +68,325 @@ def crear_producto(producto: ProductoCreate, session: Session = Depends(get_sess
         categoria_id=producto.categoria_id,
     )
     session.add(nuevo_producto)
-    session.commit()
-    session.refresh(nuevo_producto)
+    await estadisticas.aplicar_cambios(session, [(None, estadisticas.estado(nuevo_producto))])
+    if registro is not None:
+        # El ID hace falta para guardar la respuesta antes del commit
+        await session.flush()
+        await idempotencia.registrar(session, registro, ProductoRead.model_validate(nuevo_producto))
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(nuevo_producto)
+    cache.invalidar_producto(None, nuevo_producto.categoria_id)
+    busqueda.producto_guardado(nuevo_producto.id, nuevo_producto.nombre, nuevo_producto.descripcion, nuevo_producto.activo)
     return nuevo_producto
 
 # ==============================
 # 🔍 LISTAR PRODUCTOS CON FILTROS
 # ==============================
 
-@router.get("/", response_model=List[ProductoRead])
-def listar_productos(
-    stock_min: Optional[int] = None,
-    stock_max: Optional[int] = None,
-    precio_min: Optional[float] = None,
-    precio_max: Optional[float] = None,
-    categoria_id: Optional[int] = None,
-    session: Session = Depends(get_session)
+TAMANO_LOTE_STREAMING = 500
+
+
+def _residual(columna):
+    """
+    `+columna`: SQLite no usa índices para un término con el + unario, así que el
+    filtro se evalúa sobre las filas que ya recorre el plan (PostgreSQL lo ignora).
+    """
+    return UnaryExpression(columna, operator=operators.custom_op("+"), type_=columna.type)
+
+
+def _query_productos_activos(
+    stock_min: Optional[int],
+    stock_max: Optional[int],
+    precio_min: Optional[float],
+    precio_max: Optional[float],
+    categoria_id: Optional[int],
+    columnas: Optional[tuple] = None,
+    orden: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
-    query = select(Producto).where(Producto.activo == True)
+    """
+    Productos activos filtrados; con `columnas` selecciona solo esas columnas como filas.
+    Con `orden` (paginación por keyset) los rangos que no sirven al índice del orden
+    quedan como filtros residuales: la página recorre el rowid o el índice de precio
+    en orden y se detiene al llenarse, en vez de ordenar todas las filas del rango
+    en un B-tree temporal (ver VENTANA_KEYSET). Con cursor, el límite inferior de
+    precio lo pone el cursor.
+    """
+    stock = _residual(Producto.stock) if orden else Producto.stock
+    precio_hasta = _residual(Producto.precio) if orden == "id" else Producto.precio
+    precio_desde = _residual(Producto.precio) if orden == "id" or (orden and cursor) else Producto.precio
+    query = (select(*columnas) if columnas else select(Producto)).where(Producto.activo == True)
     if stock_min is not None:
-        query = query.where(Producto.stock >= stock_min)
+        query = query.where(stock >= stock_min)
     if stock_max is not None:
-        query = query.where(Producto.stock <= stock_max)
+        query = query.where(stock <= stock_max)
     if precio_min is not None:
-        query = query.where(Producto.precio >= precio_min)
+        query = query.where(precio_desde >= precio_min)
     if precio_max is not None:
-        query = query.where(Producto.precio <= precio_max)
+        query = query.where(precio_hasta <= precio_max)
     if categoria_id is not None:
         query = query.where(Producto.categoria_id == categoria_id)
-    productos = session.exec(query).all()
-    if not productos:
+    return query
+
+
+def _clave_orden(producto: Producto, orden: str) -> tuple:
+    return (producto.precio, producto.id) if orden == "precio" else (producto.id,)
+
+
+def _aplicar_keyset(query, orden: str, cursor: Optional[str]):
+    """Ordena por (id) o (precio, id) y continúa después de la clave del cursor."""
+    columnas = (Producto.precio, Producto.id) if orden == "precio" else (Producto.id,)
+    if cursor is not None:
+        clave = decodificar_cursor(cursor, len(columnas))
+        query = query.where(tuple_(*columnas) > tuple_(*clave))
+    return query.order_by(*columnas)
+
+# ======================
+# 🪟 VENTANAS DE KEYSET
+# ======================
+# Una página por keyset cuyos rangos no sirven a su orden puede recorrer ese
+# orden (el rowid o el índice de precio) y filtrar, o buscar en el índice del
+# rango y ordenar sus filas. Lo primero llena la página enseguida con un rango
+# amplio pero lee la tabla entera con uno estrecho; lo segundo, al revés. Así
+# que la página recorre primero una ventana de VENTANA_KEYSET filas de su orden
+# y, si no se llenó, sigue en el índice del rango con solo las filas posteriores.
+
+VENTANA_KEYSET = 5000
+
+
+def _claves_orden(orden: str) -> tuple:
+    return (Producto.precio, Producto.id) if orden == "precio" else (Producto.id,)
+
+
+def _usa_ventana(filtros: tuple, orden: str) -> bool:
+    """Sin categoría y con rangos, por id o sin rango de precio: ningún índice sirve el filtro en orden."""
+    stock_min, stock_max, precio_min, precio_max, categoria_id = filtros
+    if categoria_id is not None or all(valor is None for valor in filtros):
+        return False
+    return orden == "id" or (precio_min is None and precio_max is None)
+
+
+def _consulta_limite_ventana(orden: str, cursor: Optional[str]):
+    """Clave de la fila VENTANA_KEYSET posiciones después del cursor; solo lee el rowid o el índice de precio."""
+    return _aplicar_keyset(select(*_claves_orden(orden)), orden, cursor).offset(VENTANA_KEYSET - 1).limit(1)
+
+
+def _consulta_en_ventana(query, orden: str, limite_ventana: tuple):
+    """La página por keyset (`query`) acotada a la ventana: una búsqueda por rango del orden."""
+    return query.where(tuple_(*_claves_orden(orden)) <= tuple_(*limite_ventana))
+
+
+def _consulta_tras_ventana(filtros: tuple, orden: str, limite_ventana: tuple, columnas: Optional[tuple] = None):
+    """Continuación tras la ventana: el índice del rango y orden solo de sus filas posteriores."""
+    claves = [_residual(columna) for columna in _claves_orden(orden)]
+    return (
+        _query_productos_activos(*filtros, columnas)
+        .where(tuple_(*claves) > tuple_(*limite_ventana))
+        .order_by(*claves)
+    )
+
+
+async def _filas_keyset(session: AsyncSession, query, filtros: tuple, orden: str, cursor: Optional[str], cuantas: int) -> list:
+    """Hasta `cuantas` filas de la página por keyset `query`, por ventanas si hace falta."""
+    if _usa_ventana(filtros, orden):
+        final = (await session.exec(_consulta_limite_ventana(orden, cursor))).first()
+        if final is not None:
+            # Por id, exec devuelve el escalar
+            limite_ventana = tuple(final) if orden == "precio" else (final,)
+            filas = (await session.exec(_consulta_en_ventana(query, orden, limite_ventana).limit(cuantas))).all()
+            if len(filas) < cuantas:
+                resto = _consulta_tras_ventana(filtros, orden, limite_ventana, serializacion.COLUMNAS_PRODUCTO)
+                filas += (await session.exec(resto.limit(cuantas - len(filas)))).all()
+            return filas
+    # Sin ventana, o queda menos de una ventana por recorrer
+    return list((await session.exec(query.limit(cuantas))).all())
+
+
+def _orden_listado(filtros: tuple):
+    """
+    Orden del listado completo. Sin categoría, los rangos buscan en su índice y
+    se ordenan solo sus filas: ordenar por el rowid llevaba a SQLite a recorrer la tabla.
+    """
+    categoria_id = filtros[-1]
+    if categoria_id is not None or all(valor is None for valor in filtros):
+        return Producto.id
+    return _residual(Producto.id)
+
+
+async def _stream_productos(query, formato: str = "ndjson", request: Optional[Request] = None):
+    """
+    Emite los productos como NDJSON o CSV leyendo del cursor del servidor por lotes,
+    de modo que la memoria no crece con el tamaño del catálogo.
+    `query` selecciona COLUMNAS_PRODUCTO: las filas planas no pasan por el mapa de
+    identidades de la sesión, que no se puede vaciar con el resultado abierto.
+    Abre su propia sesión porque el generador sigue vivo después del endpoint.
+    """
+    if formato == "csv":
+        yield encabezado_csv()
+    async with sesion_lectura(request) as session:
+        resultado = await session.stream(query.execution_options(yield_per=TAMANO_LOTE_STREAMING))
+        async for lote in resultado.partitions():
+            yield formatear_lote(lote, formato)
+
+
+async def _consultar_pagina(
+    session: AsyncSession, query, filtros: tuple, paginado: bool, limite: Optional[int], cursor: Optional[str], orden: str,
+):
+    """
+    Ejecuta el listado y devuelve (JSON, siguiente_cursor) listo para guardar en caché.
+    `query` selecciona solo las columnas de ProductoRead: las filas se codifican con orjson sin objetos ORM.
+    """
+    if not paginado:
+        # Orden explícito: sin él dependería del índice que elija el planificador
+        productos = (await session.exec(query.order_by(_orden_listado(filtros)))).all()
+        if not productos:
+            raise HTTPException(status_code=404, detail="No hay productos disponibles con esos filtros.")
+        return serializacion.filas_a_json(productos), None
+
+    limite = limite or 100
+    productos = await _filas_keyset(session, query, filtros, orden, cursor, limite + 1)
+    if not productos and cursor is None:
         raise HTTPException(status_code=404, detail="No hay productos disponibles con esos filtros.")
+    productos, siguiente_cursor = _recortar_pagina(productos, limite, orden)
+    return serializacion.filas_a_json(productos), siguiente_cursor
+
+
+def _recortar_pagina(productos: list, limite: int, orden: str) -> tuple[list, Optional[str]]:
+    """Deja `limite` de las `limite + 1` filas leídas y, si sobraba una, el cursor de la siguiente página."""
+    if len(productos) <= limite:
+        return productos, None
+    productos = productos[:limite]
+    return productos, codificar_cursor(*_clave_orden(productos[-1], orden))
+
+
+@router.get("/", response_model=List[ProductoRead])
+async def listar_productos(
+    request: Request,
+    stock_min: Optional[int] = None,
+    stock_max: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    categoria_id: Optional[int] = None,
+    limite: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página (activa la paginación)"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    orden: Literal["id", "precio"] = "id",
+    formato: Literal["json", "ndjson"] = "json",
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
+    """
+    Lista los productos activos con filtros opcionales.
+    Con `limite` o `cursor` pagina por keyset y devuelve el siguiente cursor
+    en la cabecera `X-Next-Cursor`; con `formato=ndjson` transmite las filas por lotes
+    (con `limite`, la página entera y el mismo cursor).
+    La respuesta JSON lleva ETag de la versión del catálogo: con `If-None-Match`
+    coincidente devuelve 304 sin ejecutar el listado.
+    """
+    paginado = limite is not None or cursor is not None
+    keyset = paginado or formato == "ndjson"
+    filtros = (stock_min, stock_max, precio_min, precio_max, categoria_id)
+    query = _query_productos_activos(*filtros, serializacion.COLUMNAS_PRODUCTO, orden if keyset else None, cursor)
+    if keyset:
+        query = _aplicar_keyset(query, orden, cursor)
+    if formato == "ndjson":
+        if limite is None:
+            return StreamingResponse(_stream_productos(query, request=request), media_type="application/x-ndjson")
+        # Una página acotada (hasta 1000 filas): se lee antes de responder para
+        # poder enviar X-Next-Cursor, que como cabecera va antes del cuerpo
+        productos = await _filas_keyset(session, query, filtros, orden, cursor, limite + 1)
+        productos, siguiente_cursor = _recortar_pagina(productos, limite, orden)
+        headers = {"X-Next-Cursor": siguiente_cursor} if siguiente_cursor else None
+        return Response(formatear_lote(productos, "ndjson"), media_type="application/x-ndjson", headers=headers)
+
+    clave = (stock_min, stock_max, precio_min, precio_max, categoria_id, limite, cursor, orden if paginado else None)
+    # Un cliente fijado a la primaria tras escribir no lee el caché (ver db.lee_de_primaria)
+    pagina = cache.FALTA if lee_de_primaria(request) else cache.listados_productos.obtener(clave)
+    if pagina is cache.FALTA:
+        # La versión se lee antes que las filas: si cambia entre medias, el ETag
+        # queda más viejo que el cuerpo y el cliente solo revalida de más
+        validadores = await condicionales.version_catalogo(session)
+        if condicionales.no_modificado(request, validadores):
+            return condicionales.respuesta_no_modificado(validadores)
+        pagina = (*await _consultar_pagina(session, query, filtros, paginado, limite, cursor, orden), validadores)
+        cache.listados_productos.guardar(clave, pagina)
+    cuerpo, siguiente_cursor, validadores = pagina
+    if condicionales.no_modificado(request, validadores):
+        return condicionales.respuesta_no_modificado(validadores)
+    headers = condicionales.cabeceras(validadores)
+    if siguiente_cursor:
+        headers["X-Next-Cursor"] = siguiente_cursor
+    return serializacion.respuesta_json(cuerpo, headers)
+
+
+# ==============================
+# 📥 IMPORTAR / 📤 EXPORTAR EN BLOQUE
+# ==============================
+
+@router.post("/importar", response_model=ResultadoImportacion)
+async def importar_productos_en_bloque(
+    request: Request,
+    formato: Literal["csv", "ndjson"] = "csv",
+    tamano_lote: int = Query(TAMANO_LOTE_IMPORTACION, ge=1, le=10000),
+    session: AsyncSession = Depends(get_async_session_escritura),
+):
+    """
+    Importa productos desde el cuerpo de la petición (CSV con encabezado o NDJSON),
+    leyéndolo en streaming. Inserta por lotes y devuelve las filas rechazadas.
+    """
+    return await importar_productos(session, lineas_de_bytes(request.stream()), formato, tamano_lote)
+
+
+@router.get("/exportar")
+async def exportar_productos(request: Request, formato: Literal["csv", "ndjson"] = "csv"):
+    """
+    Exporta todo el catálogo (activos e inactivos) en streaming, ordenado por ID.
+    El CSV resultante se puede volver a cargar con /productos/importar.
+    """
+    query = select(*serializacion.COLUMNAS_PRODUCTO).order_by(Producto.id)
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+    return StreamingResponse(_stream_productos(query, formato=formato, request=request), media_type=media_type)
+
+# ======================
+# 🔎 BÚSQUEDA DE TEXTO COMPLETO
+# ======================
+
+@router.get("/buscar", response_model=List[ProductoRead])
+async def buscar_productos(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Palabras a buscar en nombre y descripción"),
+    limite: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    session: AsyncSession = Depends(get_async_session_lectura),
+):
+    """
+    Busca productos activos por nombre y descripción, ordenados por relevancia (BM25).
+    Ignora tildes y mayúsculas y cada palabra coincide por prefijo ("zap" → "zapatilla").
+    El siguiente cursor llega en la cabecera `X-Next-Cursor`.
+    """
+    if busqueda.consulta_fts(q) is None:
+        raise HTTPException(status_code=400, detail="La búsqueda debe contener al menos una palabra")
+    # En la búsqueda el orden es por relevancia, así que el cursor guarda el desplazamiento
+    desplazamiento = decodificar_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(desplazamiento, int) or desplazamiento < 0:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    if busqueda.MODO == "fts5":
+        query = busqueda.query_fts5(q).offset(desplazamiento).limit(limite + 1)
+        productos = list((await session.exec(query)).all())
+    elif not busqueda.INDICE_LISTO:
+        # El worker acaba de arrancar y el índice en memoria aún se construye
+        query = busqueda.query_like(q).order_by(Producto.id).offset(desplazamiento).limit(limite + 1)
+        productos = list((await session.exec(query)).all())
+    else:
+        ids = busqueda.indice.buscar(q)[desplazamiento:desplazamiento + limite + 1]
+        # El índice de este worker puede ir hasta un refresco por detrás: la base decide qué sigue activo
+        query = select(Producto).where(Producto.id.in_(ids), Producto.activo == True)
+        encontrados = {p.id: p for p in (await session.exec(query)).all()}
+        productos = [encontrados[i] for i in ids if i in encontrados]
+
+    if len(productos) > limite:
+        productos = productos[:limite]
+        response.headers["X-Next-Cursor"] = codificar_cursor(desplazamiento + limite)
     return productos
 
 # ======================
@@ -73,29 +394,47 @@ def listar_productos(
 # ======================
 
 @router.get("/{producto_id}", response_model=ProductoRead)
-def obtener_producto(producto_id: int, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
-    if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    producto.categoria
-    return producto
+async def obtener_producto(
+    producto_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session_lectura),
+):
+    """Devuelve el producto con un ETag de su `ultima_actualizacion` (304 si no cambió)."""
+    entrada = cache.FALTA if lee_de_primaria(request) else cache.productos_por_id.obtener(producto_id)
+    if entrada is cache.FALTA:
+        producto = await session.get(Producto, producto_id)
+        if not producto:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        entrada = (
+            ProductoRead.model_validate(producto),
+            condicionales.validadores_producto(producto.id, producto.ultima_actualizacion),
+        )
+        cache.productos_por_id.guardar(producto_id, entrada)
+    respuesta, validadores = entrada
+    if condicionales.no_modificado(request, validadores):
+        return condicionales.respuesta_no_modificado(validadores)
+    response.headers.update(condicionales.cabeceras(validadores))
+    return respuesta
 
 # ======================
 # ⚙️ ACTUALIZAR PRODUCTO
 # ======================
 
 @router.put("/{producto_id}", response_model=ProductoRead)
-def actualizar_producto(producto_id: int, datos: ProductoCreate, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
+async def actualizar_producto(producto_id: int, datos: ProductoCreate, session: AsyncSession = Depends(get_async_session_escritura)):
+    producto = await session.get(Producto, producto_id)
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    categoria = session.get(Categoria, datos.categoria_id)
+    categoria = await session.get(Categoria, datos.categoria_id)
     if not categoria or not categoria.activa:
         raise HTTPException(status_code=404, detail="Categoría no encontrada o inactiva")
     if datos.stock < 0:
         raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
     if datos.precio <= 0:
         raise HTTPException(status_code=400, detail="El precio debe ser mayor que cero")
+    categoria_anterior = producto.categoria_id
+    antes = estadisticas.estado(producto)
     producto.nombre = datos.nombre
     producto.descripcion = datos.descripcion
     producto.precio = datos.precio
@@ -103,8 +442,12 @@ def actualizar_producto(producto_id: int, datos: ProductoCreate, session: Sessio
     producto.categoria_id = datos.categoria_id
     producto.ultima_actualizacion = datetime.utcnow()
     session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    await estadisticas.aplicar_cambios(session, [(antes, estadisticas.estado(producto))])
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(producto)
+    cache.invalidar_producto(producto_id, categoria_anterior, producto.categoria_id)
+    busqueda.producto_guardado(producto.id, producto.nombre, producto.descripcion, producto.activo)
     return producto
 
 # ==========================
@@ -112,16 +455,22 @@ def actualizar_producto(producto_id: int, datos: ProductoCreate, session: Sessio
 # ==========================
 
 @router.patch("/{producto_id}/desactivar", response_model=ProductoRead)
-def desactivar_producto(producto_id: int, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
+async def desactivar_producto(producto_id: int, session: AsyncSession = Depends(get_async_session_escritura)):
+    producto = await session.get(Producto, producto_id)
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     if not producto.activo:
         raise HTTPException(status_code=409, detail="El producto ya está inactivo")
+    antes = estadisticas.estado(producto)
     producto.activo = False
+    producto.ultima_actualizacion = datetime.utcnow()
     session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    await estadisticas.aplicar_cambios(session, [(antes, estadisticas.estado(producto))])
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(producto)
+    cache.invalidar_producto(producto_id, producto.categoria_id)
+    busqueda.producto_guardado(producto.id, producto.nombre, producto.descripcion, producto.activo)
     return producto
 
 # ==========================
@@ -129,16 +478,22 @@ def desactivar_producto(producto_id: int, session: Session = Depends(get_session
 # ==========================
 
 @router.patch("/{producto_id}/reactivar", response_model=ProductoRead)
-def reactivar_producto(producto_id: int, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
+async def reactivar_producto(producto_id: int, session: AsyncSession = Depends(get_async_session_escritura)):
+    producto = await session.get(Producto, producto_id)
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     if producto.activo:
         raise HTTPException(status_code=409, detail="El producto ya está activo")
+    antes = estadisticas.estado(producto)
     producto.activo = True
+    producto.ultima_actualizacion = datetime.utcnow()
     session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    await estadisticas.aplicar_cambios(session, [(antes, estadisticas.estado(producto))])
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    await session.refresh(producto)
+    cache.invalidar_producto(producto_id, producto.categoria_id)
+    busqueda.producto_guardado(producto.id, producto.nombre, producto.descripcion, producto.activo)
     return producto
 
 # =======================================
@@ -149,19 +504,108 @@ class CompraRequest(BaseModel):
     cantidad: int
 
 @router.patch("/{producto_id}/comprar", response_model=ProductoRead)
-def comprar_producto(producto_id: int, data: CompraRequest, session: Session = Depends(get_session)):
-    producto = session.get(Producto, producto_id)
-    if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    if not producto.activo:
-        raise HTTPException(status_code=400, detail="No se puede comprar un producto inactivo")
+async def comprar_producto(
+    producto_id: int,
+    data: CompraRequest,
+    idempotency_key: Optional[str] = IdempotencyKey,
+    session: AsyncSession = Depends(get_async_session_escritura),
+):
+    """
+    Descuenta stock con un UPDATE condicional atómico (sin lectura previa),
+    evitando sobreventas cuando llegan compras concurrentes del mismo producto.
+    Con `Idempotency-Key` los reintentos reciben la respuesta original sin volver a descontar.
+    Con COMPRAS_AGRUPADAS la compra se encola y se confirma junto con otras en un solo commit.
+    """
     if data.cantidad <= 0:
         raise HTTPException(status_code=400, detail="La cantidad debe ser mayor que cero")
-    if producto.stock < data.cantidad:
-        raise HTTPException(status_code=400, detail="Stock insuficiente para la compra")
-    producto.stock -= data.cantidad
-    producto.ultima_actualizacion = datetime.utcnow()
-    session.add(producto)
-    session.commit()
-    session.refresh(producto)
+    return await idempotencia.ejecutar(
+        session, idempotency_key, idempotencia.huella("comprar", producto_id, data.cantidad),
+        lambda registro: _comprar_producto(session, producto_id, data.cantidad, registro),
+    )
+
+
+async def _comprar_producto(session: AsyncSession, producto_id: int, cantidad: int, registro: Optional[idempotencia.Registro]):
+    if cola_compras.activa():
+        respuesta = await cola_compras.comprar(producto_id, cantidad, registro)
+        if respuesta is None:
+            codigo, detalle = await motivo_compra_rechazada(session, producto_id)
+            raise HTTPException(status_code=codigo, detail=detalle)
+        return respuesta
+    producto = await descontar_stock(session, producto_id, cantidad)
+    if producto is None:
+        await session.rollback()
+        codigo, detalle = await motivo_compra_rechazada(session, producto_id)
+        raise HTTPException(status_code=codigo, detail=detalle)
+    despues = estadisticas.estado(producto)
+    await estadisticas.aplicar_cambios(session, [(despues._replace(stock=despues.stock + cantidad), despues)])
+    await idempotencia.registrar(session, registro, ProductoRead.model_validate(producto))
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    cache.invalidar_producto(producto_id, producto.categoria_id)
     return producto
+
+# =======================================
+# 🛒 COMPRA POR LOTE (CARRITO COMPLETO)
+# =======================================
+
+@router.post("/comprar-lote", response_model=List[LineaCompraResultado])
+async def comprar_lote(
+    data: CompraLoteRequest,
+    idempotency_key: Optional[str] = IdempotencyKey,
+    session: AsyncSession = Depends(get_async_session_escritura),
+):
+    """
+    Compra todas las líneas del carrito en una sola transacción (todo o nada).
+    Carga los productos con una única consulta IN (...) y los descuenta
+    siempre en orden de ID para que carritos concurrentes no se bloqueen entre sí.
+    Admite `Idempotency-Key` como la compra individual.
+    """
+    return await idempotencia.ejecutar(
+        session, idempotency_key, idempotencia.huella("comprar_lote", data.model_dump()),
+        lambda registro: _comprar_lote(session, data, registro),
+    )
+
+
+async def _comprar_lote(session: AsyncSession, data: CompraLoteRequest, registro: Optional[idempotencia.Registro]):
+    cantidades: dict[int, int] = {}
+    for linea in data.lineas:
+        cantidades[linea.producto_id] = cantidades.get(linea.producto_id, 0) + linea.cantidad
+    ids = sorted(cantidades)
+
+    query = select(Producto).where(Producto.id.in_(ids)).order_by(Producto.id).with_for_update()
+    productos = {producto.id: producto for producto in await session.exec(query)}
+    for producto_id in ids:
+        producto = productos.get(producto_id)
+        if not producto:
+            raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado")
+        if not producto.activo:
+            raise HTTPException(status_code=400, detail=f"El producto {producto_id} está inactivo")
+        if producto.stock < cantidades[producto_id]:
+            raise HTTPException(status_code=400, detail=f"Stock insuficiente para el producto {producto_id}")
+
+    stock_restante: dict[int, int] = {}
+    cambios = []
+    for producto_id in ids:
+        actualizado = await descontar_stock(session, producto_id, cantidades[producto_id])
+        if actualizado is None:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail=f"El stock del producto {producto_id} cambió durante la compra")
+        stock_restante[producto_id] = actualizado.stock
+        despues = estadisticas.estado(actualizado)
+        cambios.append((despues._replace(stock=despues.stock + cantidades[producto_id]), despues))
+    await estadisticas.aplicar_cambios(session, cambios)
+    categorias = {producto_id: productos[producto_id].categoria_id for producto_id in ids}
+    resultado = [
+        LineaCompraResultado(
+            producto_id=linea.producto_id,
+            cantidad=linea.cantidad,
+            stock_restante=stock_restante[linea.producto_id],
+        )
+        for linea in data.lineas
+    ]
+    await idempotencia.registrar(session, registro, resultado)
+    await condicionales.avanzar_version(session)
+    await session.commit()
+    for producto_id, categoria_id in categorias.items():
+        cache.invalidar_producto(producto_id, categoria_id)
+    return resultado
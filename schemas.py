@@ -4,6 +4,7 @@ Definen la estructura de entrada y salida de los endpoints.
 """
 
 from typing import Optional, List
+from datetime import datetime
 from pydantic import BaseModel, Field
 
 # ======================
@@ -29,6 +30,11 @@ class CategoriaRead(CategoriaBase):
         from_attributes = True  # ✅ Pydantic v2 compatible
 
 
+class CategoriaCascada(CategoriaRead):
+    """Categoría tras desactivar/reactivar, con el número de productos afectados por la cascada"""
+    productos_afectados: int
+
+
 class CategoriaUpdate(BaseModel):
     """Esquema para actualizar una categoría existente"""
     nombre: Optional[str] = None
@@ -79,3 +85,63 @@ class ProductoUpdate(BaseModel):
 class CategoriaConProductos(CategoriaRead):
     """Devuelve la categoría junto con la lista de productos asociados"""
     productos: List[ProductoRead] = []
+
+
+class CategoriaResumen(CategoriaRead):
+    """Categoría con conteos agregados de sus productos, sin embeberlos"""
+    productos_totales: int
+    productos_activos: int
+    stock_total: int = Field(..., description="Stock sumado de los productos activos")
+
+
+class CategoriaEstadisticasRead(BaseModel):
+    """Agregados precalculados de los productos activos de una categoría"""
+    categoria_id: int
+    productos_activos: int
+    stock_total: int
+    valor_inventario: float = Field(..., description="Suma de precio * stock de los productos activos")
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    actualizado: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# ==============================
+# 🛒 COMPRA POR LOTE (CARRITO)
+# ==============================
+
+class LineaCompra(BaseModel):
+    """Una línea del carrito: producto y cantidad a comprar"""
+    producto_id: int
+    cantidad: int = Field(..., gt=0)
+
+
+class CompraLoteRequest(BaseModel):
+    """Carrito completo que se compra en una sola transacción"""
+    lineas: List[LineaCompra] = Field(..., min_length=1)
+
+
+class LineaCompraResultado(BaseModel):
+    """Resultado de cada línea: stock restante tras aplicar todo el carrito"""
+    producto_id: int
+    cantidad: int
+    stock_restante: int
+
+
+
+# ==============================
+# 📥 IMPORTACIÓN MASIVA
+# ==============================
+
+class ErrorImportacion(BaseModel):
+    """Fila del archivo que no se pudo importar y sus motivos"""
+    fila: int
+    errores: List[str]
+
+
+class ResultadoImportacion(BaseModel):
+    """Resumen de una importación masiva de productos"""
+    importados: int
+    errores: List[ErrorImportacion] = []
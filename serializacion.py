@@ -0,0 +1,34 @@
+"""
+Camino rápido de serialización para los listados de la Tienda Online.
+
+En vez de cargar objetos ORM, validarlos uno a uno contra el `response_model`
+(from_attributes) y volver a codificarlos, los listados seleccionan solo las
+columnas del esquema de salida como filas planas y las codifican de una vez
+con orjson. El JSON resultante es idéntico al que produce FastAPI.
+Los endpoints optan por este camino devolviendo `respuesta_json`; el
+`response_model` se mantiene para la documentación OpenAPI.
+"""
+
+from typing import Optional, Sequence
+import orjson
+from fastapi.responses import Response
+from models import Categoria, Producto
+from schemas import CategoriaRead, ProductoRead
+
+# Columnas en el mismo orden que los campos del esquema: así las claves
+# del JSON salen en el mismo orden que con la validación de Pydantic
+COLUMNAS_PRODUCTO = tuple(getattr(Producto, campo) for campo in ProductoRead.model_fields)
+COLUMNAS_CATEGORIA = tuple(getattr(Categoria, campo) for campo in CategoriaRead.model_fields)
+
+
+def filas_a_json(filas: Sequence) -> bytes:
+    """Codifica filas (Row) como una lista JSON de objetos, con las etiquetas de columna como claves."""
+    if not filas:
+        return b"[]"
+    campos = filas[0]._fields
+    return orjson.dumps([dict(zip(campos, fila)) for fila in filas])
+
+
+def respuesta_json(cuerpo: bytes, headers: Optional[dict] = None) -> Response:
+    """Respuesta con un cuerpo ya codificado: no pasa por el `response_model` ni por otro encoder."""
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
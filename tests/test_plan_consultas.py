@@ -0,0 +1,39 @@
+"""
+Planes de consulta de `listar_productos` para cada combinación de filtros, con
+las mismas reglas que benchmarks/plan_consultas.py (que además imprime cada plan).
+"""
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+sys.path.insert(0, RAIZ)
+
+import plan_consultas
+from sqlmodel import SQLModel, create_engine
+
+
+@pytest.fixture(scope="module")
+def conexion(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plan') / 'plan.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as conexion:
+        yield conexion
+
+
+@pytest.mark.parametrize(
+    "filtros",
+    list(plan_consultas.combinaciones()),
+    ids=lambda filtros: "+".join(k for k, v in filtros.items() if v is not None) or "solo_activo",
+)
+def test_ningun_filtro_recorre_la_tabla_ni_ordena_una_pagina(conexion, filtros):
+    fallos = {
+        variante: (encontrados, detalle)
+        for variante, query in plan_consultas.sentencias(filtros).items()
+        for detalle in [plan_consultas.plan(conexion, query)]
+        if (encontrados := plan_consultas.problemas(variante, filtros, detalle))
+    }
+    assert not fallos